@@ -4,7 +4,17 @@ A compliation of breach information gathered from data aggregators, breach looku
 ## Indexed Services
 README_TABLE
 
-You can find the datasets in `datasets/`, each file here contains data obtained from the individual providers with the exception of `combined.json` which is a compilation of all data.
+You can find the datasets in `datasets/`, each file here contains data obtained from the individual providers, with the exception of the files below, which `scraper.py` derives from them. Only `combined.json` is committed, the nightly job publishes the others with the search page to GitHub Pages (the repository's Pages source has to be set to GitHub Actions):
+ - `combined.json` - a compilation of all data.
+ - `stats.json` - every dataset summarised (breach count, total/min/max records and breach date range), `table-gen.py` builds the table above from it.
+ - `entities.json` - the breaches reported more than once (e.g. `LinkedIn`, `linkedin.com` and `LinkedIn 2012`) grouped into entities, each listing its sources, the min/max record counts reported and the rows of its records in `combined.json`.
+ - `breaches.sqlite` - the compilation as a ready to query SQLite database, a `breaches` table indexed on `record_count`, `breach_date` and `source`.
+ - `breaches-search.sqlite` - `breaches.sqlite` plus an FTS5 trigram index over `dump_name`, `info` and `source`, only built by `scraper.py --search-index` or `python sqlite_export.py` (needs SQLite 3.34+ with FTS5, skipped with a warning otherwise). The index triples the size and the stock sql.js build can't use it, so it is for `search.py` and `query_service.py` only: searches in the browser are still `LIKE '%term%'` scans of `breaches.sqlite`'s data.
+ - `combined.col` - a compact columnar export of `combined.json` (about half the size) built by `columnar.py`: record counts as int64, dates as `YYYYMMDD` ints, sources and info dictionary-encoded. Load it with `columnar.load_columns()` in Python (memory-mapped) or `readColumnar()` from the standalone `columnar.js` in the browser.
+ - `shards/` - `combined.json` split into one shard per dataset by `shards.py`, precompressed as `.gz` (and `.br` when the optional `brotli` module is installed), `shards/manifest.json` lists every shard with its row count, sizes and SHA-256.
+ - `domains.idx` - the breaches indexed by the registrable domain in their name (e.g. `HO[1188]__Shertonenglish.com`) by `domain_index.py`, `python domain_index.py lookup example.com ...` (or `--file domains.txt`) or `domain_index.DomainIndex` list the breaches involving thousands of domains in milliseconds.
+
+The search page keeps its database in a Web Worker (`worker.js`), it streams in the shards (falling back to `combined.json`, then `breaches.sqlite`), caches them by hash across visits and shows the table with the first breaches, searches never block the page while the rest loads. For heavier use, `query_service.py` answers the search page's queries from `breaches-search.sqlite` (falling back to `breaches.sqlite`) over HTTP, paging with keyset cursors and caching recent pages and counts: run `python query_service.py --port 8080` (or any WSGI server with `query_service:create_app()`) and set `QUERY_ENDPOINT` in `main.js` to its `/search` URL, visitors then no longer download the database.
 
 As vigilante.pw is currently down and has been for a while, the data set from the following github repository was used [https://github.com/wedataintelligence/Vigilante.pw](https://github.com/wedataintelligence/Vigilante.pw).
 
@@ -26,6 +36,22 @@ To run the script, you simply need to run the following command. This will reach
 $ FLARESOLVERR_URL=REPLACEME HASHMOB_API_KEY=REPLACEME python3 scraper.py
 ```
 
+Providers are scraped in parallel, `--workers` caps how many run at the same time (default 8) and `--timeout` sets how many seconds a provider may take before it is abandoned (default 900, Dehashed is allowed an hour). An abandoned provider is left running in the background and doesn't hold up the end of the run. A failing provider doesn't affect the others, its previous dataset is simply left as is. Each provider's breaches are saved as `datasets/<provider>.json` and `datasets/<provider>.csv` (plus `datasets/<provider>.ndjson`, one breach per line, with `--ndjson`), written in a single pass to temporary files that replace the previous ones only once complete, so an interrupted run never leaves a truncated dataset. The CSV columns are the fields the provider's breaches actually have, in the order `dump_name`, `breach_date`, `record_count`, `info`, `index_date`, `description`, `source`.
+
+All providers share one pool of keep-alive connections, created on the first request. Every request gives up after 10 seconds without a connection (`--connect-timeout`) or 60 seconds without data (`--read-timeout`), so a hung host fails fast instead of stalling the run. Connection errors and `500`/`502`/`504` responses of idempotent requests are retried `--retries` times (default 3) with exponential backoff, honouring `Retry-After`.
+
+Provider responses are cached in `.cache/http/` and revalidated with `If-None-Match`/`If-Modified-Since` on the next run, so a provider that hasn't changed only costs a `304` and its previously parsed results are reused. The archived datasets, which never change, are cleaned once and kept in `.cache/archived/` under a hash of their content, so they are unpickled in milliseconds instead of parsed again on every run (by `table-gen.py` too) and a changed file simply misses the cache. Pass `--no-cache` to always download and parse everything.
+
+With `--incremental` (used by the nightly job) a provider's files are only rewritten when its breaches actually changed, and the combined datasets are only rebuilt when at least one provider changed. Every added, removed or changed record (keyed by `source` and `dump_name`) is appended to the day's `datasets/delta/YYYY-MM-DD.ndjson`, so consumers can sync the changes since their last update instead of downloading everything again. Changed records only list the fields that changed (`{"fields": {"record_count": [old, new]}}`), removed ones only their key, and the daily logs are kept for 30 days. Every provider run is also appended to `datasets/history.bin` (kept in the nightly job's cache and published with the site), a compact history of each breach's record count keyed by `source` and `dump_name` (varint-encoded deltas, a few bytes for a run without changes): `python history.py breach Dehashed <dump_name>` shows when a breach was first and last seen and how its count evolved, `python history.py source Dehashed` the breach and record totals of every run, and `python history.py backfill` imports the git history of the datasets into a new history.
+
+Instead of a one-off run, `--daemon` keeps the scraper running and refreshes every provider on its own interval: HaveIBeenPwned every 6 hours, Dehashed every 3 days and the others daily, each spread by a random jitter of 10%. Sessions, pooled connections and clearance cookies stay warm between refreshes. A provider that fails is retried after 15 minutes, backing off twice as long after every consecutive failure (up to its interval). Refreshes are always incremental, and the combined datasets are only rebuilt when a refreshed provider actually changed. The schedule is saved in `.cache/schedule.json`, so a restarted daemon doesn't refresh providers that are still fresh. `SIGTERM` stops the daemon once the refreshes in progress are saved.
+
+Every run logs a summary per provider: status, breaches, time spent scraping, fetching, parsing and writing, HTTP requests by status code, retries, and bytes downloaded and written. It also logs FlareSolverr solve times and the peak RSS. `--report run.json` saves this as JSON and `--metrics run.prom` in the Prometheus text format (for node_exporter's textfile collector), so runs can be trended and slow or failing providers alerted on. Requests, retries (including the transport's own), bytes and phase times are `_total` counters, since they keep growing across the rounds of `--daemon`.
+
+`python replay.py record` runs the enabled providers while saving every response they get (including the FlareSolverr solves) to `benchmarks/fixtures/http`. `python benchmarks/bench_suite.py` then replays them offline. It prints JSON with the rows, best wall time, rows/s and peak allocated memory of every scraper and of the `clean_json`, combine and `table-gen.py` stages. Pass `--baseline <previous results>` to exit non-zero when something got more than 25% slower.
+
+FlareSolverr is only used to obtain Cloudflare clearance cookies, these are kept per domain in `.cache/clearance.json` together with the user agent they were issued to and reused by regular requests until they expire or get rejected.
+
 ### Viewing the datasets
 A very simple static site is provided within this repository, you can simply drag and drop, clone or copy this repository to a webserver and it should work fine, alternatively, you can also run a simple python webserver by running `python3 -m http.server` and viewing the site on `http://localhost:8000`, or view the public instance [here](https://breaches.dls.sh/).
 
@@ -0,0 +1,79 @@
+import hashlib, json, os, pickle, threading, logging
+import combine
+
+
+"""
+Cache of the static archived datasets (Cit0day.json, Hacked-Emails.json, BreachAware.json, ...), which never change
+but are loaded on every run. The cleaned breaches of a dataset file, with their source set, are pickled under a hash
+of the file's content, so an unchanged file is unpickled rather than parsed again and a changed file simply misses
+the cache. The entry of the file's previous content is removed when the new one is written.
+"""
+
+DEFAULT_CACHE_DIR = ".cache/archived"
+# bump when the cleaning of the records changes, so entries written by older code are ignored
+FORMAT_VERSION = 1
+
+def prepare(breaches, dataset):
+    """
+    Cleans breaches in place and sets their source to dataset.
+    """
+    for breach in breaches:
+        combine.clean_record(breach)
+        breach["source"] = dataset
+    return breaches
+
+class ArchiveCache:
+    """
+    Content hash keyed store of cleaned datasets. Each entry is <dataset key>.<content key>.pickle.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+        self.lock = threading.Lock()
+
+    def _keys(self, dataset, data):
+        dataset_key = hashlib.sha256(dataset.encode()).hexdigest()[:16]
+        digest = hashlib.sha256("{}\n{}\n{}\n".format(FORMAT_VERSION, ",".join(combine.WHITELIST), dataset).encode())
+        digest.update(data)
+        return dataset_key, digest.hexdigest()
+
+    def _write(self, path, data):
+        # write to a temporary file first so an interrupted run never leaves a truncated entry behind
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove_stale(self, dataset_key, keep):
+        for file in os.listdir(self.directory):
+            if file.startswith(dataset_key + ".") and file.endswith(".pickle") and file != keep:
+                try:
+                    os.remove(os.path.join(self.directory, file))
+                except OSError:
+                    pass
+
+    def load(self, path, dataset):
+        """
+        Returns the cleaned breaches of the dataset file at path with their source set to dataset, from the cache
+        when the file hasn't changed since it was cached.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if not self.enabled:
+            return prepare(json.loads(data), dataset)
+        dataset_key, content_key = self._keys(dataset, data)
+        file = "{}.{}.pickle".format(dataset_key, content_key)
+        try:
+            with open(os.path.join(self.directory, file), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning("Ignoring unreadable cache entry for %s: %s", path, str(e))
+        breaches = prepare(json.loads(data), dataset)
+        with self.lock:
+            self._write(os.path.join(self.directory, file), pickle.dumps(breaches, protocol=pickle.HIGHEST_PROTOCOL))
+            self._remove_stale(dataset_key, file)
+        logging.debug("Cached %s as %s", path, file)
+        return breaches
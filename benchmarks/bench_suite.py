@@ -0,0 +1,227 @@
+import argparse, contextlib, io, json, os, platform, runpy, shutil, sys, tempfile, time, tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import scraper, replay, clearance, combine, delta
+
+
+"""
+Benchmarks every scraper against recorded responses (see replay.py) and the combine, clean_json and table-gen.py
+stages against the datasets, and prints the results as JSON: per benchmark the rows processed, the best wall time,
+the rows per second and the peak memory allocated (traced in a separate run, as tracing slows the code down).
+Scrapers without recorded responses are reported as skipped.
+
+With --baseline, the results are compared with a previous run and the command exits with status 1 when a benchmark
+got slower than the baseline by more than --threshold, so CI can catch regressions before the nightly job slows down.
+
+    $ python benchmarks/bench_suite.py [--fixtures benchmarks/fixtures/http] [--output results.json] [--baseline baseline.json]
+"""
+
+DEFAULT_THRESHOLD = 1.25
+# wall times under this many seconds are too noisy to flag as regressions
+MIN_COMPARED_TIME = 0.05
+
+def measure(func, repeat):
+    """
+    Runs func() repeat times and once more under tracemalloc. Returns the best wall time, the peak bytes allocated and
+    the result of the last timed run.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+def report(wall_time, peak, rows):
+    return {
+        "status": "ok",
+        "rows": rows,
+        "wall_time": round(wall_time, 6),
+        "rows_per_second": round(rows / wall_time, 1) if wall_time else None,
+        "peak_bytes": peak,
+    }
+
+def has_fixtures(directory):
+    return os.path.isdir(directory) and any(file.endswith(".json") and file != replay.ENVIRONMENT_FILE for file in os.listdir(directory))
+
+def bench_scrapers(fixtures, repeat):
+    """
+    Runs every provider's scraper against the recorded responses, each run with a fresh replay and clearance pool so
+    the recorded FlareSolverr solves are replayed too.
+    """
+    results = {}
+    if not has_fixtures(fixtures):
+        for provider in scraper.PROVIDERS:
+            results["scrape_" + provider["name"]] = {"status": "skipped", "reason": "no fixtures in {}".format(fixtures)}
+        return results
+    for name, value in replay.load_environment(fixtures).items():
+        os.environ[name] = value
+    scraper.HTTP_CACHE.enabled = False
+    # replayed failures are final, don't wait between retries
+    scraper.DEHASHED_BACKOFF = 0
+    clearance_directory = tempfile.mkdtemp()
+    solve = scraper.CLEARANCE.solve
+    try:
+        for provider in scraper.PROVIDERS:
+            # requirements that weren't recorded only need to be set, a URL-shaped placeholder works for all of them
+            for name in provider.get("requires", []):
+                os.environ.setdefault(name, "http://replay.invalid/")
+
+            def run():
+                scraper.TRANSPORT = replay.ReplayAdapter(fixtures)
+                scraper.CLEARANCE = clearance.ClearancePool(solve, os.path.join(clearance_directory, "clearance.json"))
+                if os.path.exists(scraper.CLEARANCE.path):
+                    os.remove(scraper.CLEARANCE.path)
+                try:
+                    return provider["scrape"](scraper.generate_requests_session())
+                except Exception as e:
+                    return e
+
+            wall_time, peak, result = measure(run, repeat)
+            if isinstance(result, Exception) or not result:
+                results["scrape_" + provider["name"]] = {"status": "failed", "reason": str(result) if result else "no breaches returned"}
+            else:
+                results["scrape_" + provider["name"]] = report(wall_time, peak, len(result))
+    finally:
+        scraper.TRANSPORT = None
+        shutil.rmtree(clearance_directory, ignore_errors=True)
+    return results
+
+def load_results(directory):
+    """
+    Loads the saved results of the live providers, as the combine stage gets them from the scrapers.
+    """
+    return {provider["name"]: delta.load_snapshot(os.path.join(directory, "{}.json".format(provider["output"]))) for provider in scraper.PROVIDERS}
+
+def bench_clean_json(directory, repeat):
+    datasets = [breaches for _, breaches in combine.iter_static_datasets(directory, combine.GENERATED_FILES)]
+
+    def run():
+        return sum(len(scraper.clean_json(breaches)) for breaches in datasets)
+
+    wall_time, peak, rows = measure(run, repeat)
+    return report(wall_time, peak, rows)
+
+def bench_combine(directory, output, repeat, consumers=False):
+    def run():
+        # the sources are consumed and cleaned in place, so every run starts from freshly loaded results
+        results = load_results(directory)
+        sources = scraper.combined_sources(scraper.PROVIDERS, results, directory)
+        return combine.write_combined(sources, os.path.join(output, "combined.json"), scraper.combine_consumers(output) if consumers else ())["rows"]
+
+    wall_time, peak, rows = measure(run, repeat)
+    return report(wall_time, peak, rows)
+
+def bench_table_gen(directory, output, repeat):
+    """
+    Runs table-gen.py in a scratch directory holding links to the datasets and the stats.json of the combine stage.
+    Live datasets missing from the checkout are stubbed as empty so the stage can run.
+    """
+    workspace = tempfile.mkdtemp()
+    try:
+        datasets = os.path.join(workspace, "datasets")
+        os.makedirs(datasets)
+        for file in os.listdir(directory):
+            if file.endswith(".json") and file not in combine.GENERATED_FILES:
+                os.symlink(os.path.abspath(os.path.join(directory, file)), os.path.join(datasets, file))
+        if os.path.exists(os.path.join(output, "stats.json")):
+            shutil.copy(os.path.join(output, "stats.json"), datasets)
+        for provider in scraper.PROVIDERS:
+            path = os.path.join(datasets, "{}.json".format(provider["output"]))
+            if not os.path.exists(path):
+                with open(path, "w") as f:
+                    f.write("[]")
+        shutil.copy(os.path.join(ROOT, "README.tpl"), workspace)
+        script = os.path.join(ROOT, "table-gen.py")
+
+        def run():
+            cwd = os.getcwd()
+            os.chdir(workspace)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runpy.run_path(script, run_name="__main__")
+            finally:
+                os.chdir(cwd)
+            with open(os.path.join(workspace, "README.md"), "r") as f:
+                return sum(1 for line in f if line.rstrip().endswith(("✅ |", "❌ |")))
+
+        wall_time, peak, rows = measure(run, repeat)
+        return report(wall_time, peak, rows)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def compare(results, baseline, threshold):
+    """
+    Returns the benchmarks slower than threshold times their baseline wall time.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name, {})
+        if result.get("status") != "ok" or previous.get("status") != "ok":
+            continue
+        if result["wall_time"] < MIN_COMPARED_TIME and previous["wall_time"] < MIN_COMPARED_TIME:
+            continue
+        ratio = result["wall_time"] / previous["wall_time"] if previous["wall_time"] else float("inf")
+        if ratio > threshold:
+            regressions.append({"benchmark": name, "wall_time": result["wall_time"], "baseline": previous["wall_time"], "ratio": round(ratio, 2)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the scrapers against recorded responses and the combine stages.")
+    parser.add_argument("--fixtures", default=replay.DEFAULT_FIXTURES, help="recorded responses (default: %(default)s)")
+    parser.add_argument("--datasets", default="datasets", help="datasets the combine stages run on (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name starts with one of these prefixes")
+    parser.add_argument("--output", help="file the JSON results are written to (default: stdout)")
+    parser.add_argument("--baseline", help="previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown over the baseline reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    def wanted(name):
+        return not args.only or any(name.startswith(prefix) for prefix in args.only)
+
+    results = {}
+    if not args.only or any(prefix.startswith("scrape_") or "scrape_".startswith(prefix) for prefix in args.only):
+        results.update({name: result for name, result in bench_scrapers(args.fixtures, args.repeat).items() if wanted(name)})
+    output = tempfile.mkdtemp()
+    try:
+        if wanted("clean_json"):
+            results["clean_json"] = bench_clean_json(args.datasets, args.repeat)
+        if wanted("combine"):
+            results["combine"] = bench_combine(args.datasets, output, args.repeat)
+        if wanted("combine_artifacts") or wanted("table_gen"):
+            results["combine_artifacts"] = bench_combine(args.datasets, output, args.repeat, consumers=True)
+        if wanted("table_gen"):
+            results["table_gen"] = bench_table_gen(args.datasets, output, args.repeat)
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+    summary = {
+        "generated": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            summary["regressions"] = compare(results, json.load(f), args.threshold)
+    data = json.dumps(summary, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+    if summary.get("regressions"):
+        for regression in summary["regressions"]:
+            print("{benchmark} regressed: {wall_time:.3f}s vs {baseline:.3f}s ({ratio}x)".format(**regression), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,96 @@
+import argparse, json, os, sys, time, html
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import table_parser
+
+
+"""
+Compares table_parser against the previous BeautifulSoup(..., 'html.parser') extraction on saved provider pages.
+Pages are read from <fixtures>/<name>.html, pages that haven't been saved are generated from the datasets so the
+benchmark can always run.
+
+    $ python benchmarks/bench_table_parser.py [--fixtures benchmarks/fixtures] [--repeat 3]  # from the repository root
+"""
+
+# name -> (table attrs, dataset used to generate the page, row builder)
+PAGES = {
+    "leaklookup": ({"id": "datatables-indexed-breaches"}, "Leak-Lookup.json",
+        lambda b: [b["dump_name"], "{:,}".format(int(b.get("record_count") or 0)), b.get("index_date", "")]),
+    "scatteredsecrets": ({"id": "dumps_table"}, "ScatteredSecrets.json",
+        lambda b: [b["dump_name"]]),
+    "breachdirectory": ({"class": "chakra-table"}, "BreachDirectory.json",
+        lambda b: [b["dump_name"], "{:,}".format(int(b.get("record_count") or 0)), b.get("breach_date", "")]),
+    "leaked_domains": ({"id": "leak_summery"}, "Leaked.Domains.json",
+        lambda b: [b["dump_name"], "Leakdb", "", "", b.get("info", ""), b.get("breach_date", ""), "{:,}".format(int(b.get("record_count") or 0))]),
+}
+
+def generate_page(attrs, rows):
+    """
+    Builds a page shaped like the providers' pages, with some surrounding markup so the parsers have to skip content.
+    """
+    table_attrs = " ".join('{}="{}"'.format(key, value) for key, value in attrs.items())
+    parts = ["<html><head><title>Breaches</title><script>var x = '<table>';</script></head><body>"]
+    parts.append("<nav>" + "<div class='item'><a href='#'>link</a></div>" * 200 + "</nav>")
+    parts.append("<table {}><thead><tr>{}</tr></thead><tbody>".format(table_attrs, "<th>Column</th>" * len(rows[0])))
+    for row in rows:
+        parts.append("<tr class='odd'>")
+        for cell in row:
+            parts.append("<td class='d-xl-table-cell'>\n    {}\n</td>".format(html.escape(str(cell))))
+        parts.append("<td class='table-action'><div class='dropdown'><a href='#'><i data-feather='more'></i></a></div></td></tr>")
+    parts.append("</tbody></table><footer>" + "<p>footer</p>" * 200 + "</footer></body></html>")
+    return "".join(parts)
+
+def load_page(fixtures, name):
+    path = os.path.join(fixtures, name + ".html")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return f.read(), "saved"
+    attrs, dataset, builder = PAGES[name]
+    with open(os.path.join("datasets", dataset), "r") as f:
+        breaches = json.load(f)
+    return generate_page(attrs, [builder(breach) for breach in breaches]), "generated"
+
+def soup_rows(page, attrs):
+    """
+    The extraction the scrapers used before table_parser.
+    """
+    soup = BeautifulSoup(page, 'html.parser')
+    data_table = soup.find('table', attrs)
+    rows = []
+    for entry in data_table.find('tbody').find_all('tr'):
+        rows.append(tuple(td.text.strip() for td in entry.find_all('td')))
+    return rows
+
+def streaming_rows(page, attrs):
+    return list(table_parser.iter_table_rows(page, table_id=attrs.get("id"), table_class=attrs.get("class")))
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares table_parser against BeautifulSoup on saved provider pages.")
+    parser.add_argument("--fixtures", default="benchmarks/fixtures", help="directory of saved pages (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("| Page | Source | Size | Rows | BeautifulSoup | table_parser | Speedup |")
+    print("| ---- | ------ | ---- | ---- | ------------- | ------------ | ------- |")
+    for name, (attrs, _, _) in PAGES.items():
+        try:
+            page, origin = load_page(args.fixtures, name)
+        except OSError as e:
+            print(f"| {name} | missing ({e.strerror}) | | | | | |")
+            continue
+        soup_time, expected = best_of(args.repeat, soup_rows, page, attrs)
+        stream_time, rows = best_of(args.repeat, streaming_rows, page, attrs)
+        if rows != expected:
+            print(f"Row mismatch on {name}: {len(rows)} rows vs {len(expected)} expected", file=sys.stderr)
+            sys.exit(1)
+        print(f"| {name} | {origin} | {len(page) / 1024 / 1024:.1f}MB | {len(rows):,} | {soup_time * 1000:.0f}ms | {stream_time * 1000:.0f}ms | {soup_time / stream_time:.1f}x |")
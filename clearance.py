@@ -0,0 +1,116 @@
+import json, os, threading, time, logging
+from urllib.parse import urlparse
+
+
+"""
+Keeps Cloudflare clearance cookies (cf_clearance and friends) and the user agent they were issued to per domain, so
+a FlareSolverr browser solve is only needed when the clearance is missing, expired or rejected. Entries are persisted
+to disk between runs.
+"""
+
+DEFAULT_PATH = ".cache/clearance.json"
+DEFAULT_TTL = 30 * 60 # used when the solver doesn't report an expiry for the clearance cookie
+
+def is_challenge(response):
+    """
+    Returns True if a response is a Cloudflare block or challenge page rather than the requested content.
+    """
+    if response.status_code == 403:
+        return True
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    if response.status_code == 503 and "challenge-platform" in response.text:
+        return True
+    return False
+
+class ClearancePool:
+    """
+    Per-domain store of clearance cookies. solve(url) must return a (cookies, user_agent) tuple as returned by
+    get_via_flaresolverr(url, cookies_only=True), or None if the solve failed.
+    """
+    def __init__(self, solve, path=DEFAULT_PATH):
+        self.solve = solve
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+        self.domain_locks = {}
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _domain_lock(self, domain):
+        with self.lock:
+            return self.domain_locks.setdefault(domain, threading.Lock())
+
+    def clearance(self, url, force=False):
+        """
+        Returns the clearance entry ({"cookies": {...}, "user_agent": ..., "expires": ...}) for a URL's domain,
+        solving a new one when there is no valid entry or force is set. Returns None if solving failed.
+        """
+        domain = urlparse(url).hostname
+        # only one thread solves a given domain, the others wait for its result
+        with self._domain_lock(domain):
+            with self.lock:
+                self._load()
+                entry = self.entries.get(domain)
+            if entry and not force and entry["expires"] > time.time():
+                return entry
+            logging.info("Solving Cloudflare clearance for %s", domain)
+            start = time.monotonic()
+            solution = self.solve(url)
+            if not solution:
+                logging.error("Unable to solve Cloudflare clearance for %s", domain)
+                return None
+            cookies, user_agent = solution
+            expires = [cookie.get("expiry", cookie.get("expires")) for cookie in cookies if cookie["name"] == "cf_clearance"]
+            expires = [expiry for expiry in expires if expiry and expiry > 0]
+            entry = {
+                "cookies": {cookie["name"]: cookie["value"] for cookie in cookies},
+                "user_agent": user_agent,
+                "expires": min(expires) if expires else time.time() + DEFAULT_TTL,
+            }
+            logging.info("Solved Cloudflare clearance for %s in %.1f seconds", domain, time.monotonic() - start)
+            with self.lock:
+                self.entries[domain] = entry
+                self._save()
+            return entry
+
+    def invalidate(self, url):
+        domain = urlparse(url).hostname
+        with self.lock:
+            self._load()
+            if self.entries.pop(domain, None):
+                self._save()
+
+    def get(self, session, url, **kwargs):
+        """
+        GETs a URL through a regular requests session using the domain's clearance, the clearance is solved again
+        and the request retried once if Cloudflare rejects it.
+        """
+        response = None
+        for force in (False, True):
+            entry = self.clearance(url, force=force)
+            if not entry:
+                break
+            headers = dict(kwargs.get("headers") or {})
+            headers["User-Agent"] = entry["user_agent"]
+            response = session.get(url, **dict(kwargs, headers=headers, cookies=entry["cookies"]))
+            if not is_challenge(response):
+                return response
+            logging.warning("Cloudflare clearance for %s was rejected", urlparse(url).hostname)
+            self.invalidate(url)
+        return response
@@ -0,0 +1,103 @@
+// Reader for the columnar export (datasets/combined.col) written by columnar.py. Numeric columns are typed array
+// views over the fetched buffer, strings are only decoded when a row is read.
+
+const COLUMNAR_MAGIC = 'KBCOL1';
+const COLUMNAR_TYPES = {
+    'B': Uint8Array,
+    'H': Uint16Array,
+    'I': Uint32Array,
+    'i': Int32Array,
+    'q': BigInt64Array
+};
+
+function readColumnar(buffer) {
+    const decoder = new TextDecoder();
+    const bytes = new Uint8Array(buffer);
+    if (decoder.decode(bytes.subarray(0, COLUMNAR_MAGIC.length)) !== COLUMNAR_MAGIC) {
+        throw new Error('Not a columnar export');
+    }
+    const headerLength = new DataView(buffer).getUint32(8, true);
+    const header = JSON.parse(decoder.decode(bytes.subarray(12, 12 + headerLength)));
+
+    function section(name) {
+        const spec = header.sections[name];
+        const type = COLUMNAR_TYPES[spec.type];
+        return new type(buffer, spec.offset, spec.length / type.BYTES_PER_ELEMENT);
+    }
+
+    function strings(name) {
+        const offsets = section(name + '.offsets');
+        const data = section(name + '.data');
+        return function(index) {
+            return decoder.decode(data.subarray(offsets[index], offsets[index + 1]));
+        };
+    }
+
+    const dumpName = strings('dump_name');
+    const sourceValue = strings('source.dictionary');
+    const sourceCodes = section('source.codes');
+    const sources = [];
+    for (let code = 0; code < section('source.dictionary.offsets').length - 1; code++) {
+        sources.push(sourceValue(code));
+    }
+    const text = strings('text.dictionary');
+    const infoCodes = section('info.codes');
+    const descriptionCodes = section('description.codes');
+
+    const columns = {
+        rows: header.rows,
+        recordCount: section('record_count'),
+        breachDate: section('breach_date'),
+        indexDate: section('index_date'),
+        sourceCodes: sourceCodes,
+        sources: sources,
+        dumpName: dumpName,
+        source: function(index) { return sources[sourceCodes[index]]; },
+        info: function(index) { return infoCodes[index] ? text(infoCodes[index]) : null; },
+        description: function(index) { return descriptionCodes[index] ? text(descriptionCodes[index]) : null; }
+    };
+
+    // Formats a YYYYMMDD date as YYYY, YYYY-MM or YYYY-MM-DD depending on the known parts, 0 is unknown
+    columns.formatDate = function(value) {
+        if (!value) {
+            return 'Unknown';
+        }
+        const year = Math.floor(value / 10000), month = Math.floor(value / 100) % 100, day = value % 100;
+        let formatted = String(year);
+        if (month) {
+            formatted += '-' + String(month).padStart(2, '0');
+            if (day) {
+                formatted += '-' + String(day).padStart(2, '0');
+            }
+        }
+        return formatted;
+    };
+
+    // Materializes a single row as a record object, like the rows of combined.json
+    columns.row = function(index) {
+        const recordCount = columns.recordCount[index];
+        return {
+            dump_name: dumpName(index),
+            record_count: recordCount < 0n ? null : Number(recordCount),
+            breach_date: columns.formatDate(columns.breachDate[index]),
+            index_date: columns.formatDate(columns.indexDate[index]),
+            source: columns.source(index),
+            info: columns.info(index),
+            description: columns.description(index)
+        };
+    };
+
+    return columns;
+}
+
+async function loadColumnar(url) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error('Failed to fetch ' + url + ': ' + response.status);
+    }
+    return readColumnar(await response.arrayBuffer());
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { readColumnar: readColumnar, loadColumnar: loadColumnar };
+}
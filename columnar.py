@@ -0,0 +1,220 @@
+import array, json, mmap, os, struct, sys, logging
+import dates, stats
+
+
+"""
+Compact typed columnar export of the combined dataset (combined.col). Every column is stored as one contiguous
+little-endian array so it can be memory-mapped in Python or viewed as a typed array in the browser without
+creating an object per record:
+
+    record_count            int64, -1 when the count is unknown or out of range
+    breach_date, index_date int32 YYYYMMDD, unknown month/day are 0 and an unknown date is 0
+    source                  dictionary codes (uint8/uint16) into a dictionary of the distinct sources
+    info, description       uint32 codes into a single shared text dictionary, code 0 is a missing value
+    dump_name               uint32 offsets (rows + 1) into a UTF-8 blob
+
+File layout: the magic, a uint32 header length, the JSON header and then the sections, each aligned to 8 bytes.
+The header holds the row count and, for every section, its offset (from the start of the file), byte length and
+element type. See columnar.js for the browser reader.
+"""
+
+MAGIC = b"KBCOL1\0\0"
+ALIGNMENT = 8
+
+class Dictionary:
+    """
+    Maps values to codes in insertion order, code 0 is reserved for missing values when nullable.
+    """
+    def __init__(self, nullable=False):
+        self.codes = {}
+        self.values = []
+        self.nullable = nullable
+        if nullable:
+            self.values.append("")
+
+    def encode(self, value):
+        if value is None and self.nullable:
+            return 0
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+def code_type(size):
+    return "B" if size <= 0xff else "H" if size <= 0xffff else "I"
+
+def encode_strings(values):
+    """
+    Encodes strings as (uint32 offsets, utf-8 blob).
+    """
+    offsets = [0]
+    blob = bytearray()
+    for value in values:
+        blob += value.encode("utf-8", "surrogatepass")
+        offsets.append(len(blob))
+    return struct.pack("<{}I".format(len(offsets)), *offsets), bytes(blob)
+
+class ColumnarWriter:
+    """
+    combine.write_combined() consumer writing the columnar export to path when closed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.record_count = []
+        self.breach_date = []
+        self.index_date = []
+        self.dump_name = []
+        self.sources = Dictionary()
+        self.source = []
+        self.text = Dictionary(nullable=True)
+        self.info = []
+        self.description = []
+
+    def add(self, dataset, breach):
+        record_count = stats.parse_record_count(breach.get("record_count"))
+        # a count that doesn't fit is stored as unknown rather than failing the whole export
+        if record_count is None or not 0 <= record_count < 2 ** 63:
+            record_count = -1
+        self.record_count.append(record_count)
+        self.breach_date.append(dates.normalize_date(breach.get("breach_date")))
+        self.index_date.append(dates.normalize_date(breach.get("index_date")))
+        self.dump_name.append(str(breach.get("dump_name") or ""))
+        self.source.append(self.sources.encode(breach.get("source") or dataset))
+        self.info.append(self.text.encode(breach.get("info")))
+        self.description.append(self.text.encode(breach.get("description")))
+
+    def sections(self):
+        """
+        Returns (name, element type, bytes) for every section of the file.
+        """
+        rows = len(self.record_count)
+        source_type = code_type(len(self.sources.values))
+        text_type = code_type(len(self.text.values))
+        dump_name_offsets, dump_name_bytes = encode_strings(self.dump_name)
+        source_offsets, source_bytes = encode_strings(self.sources.values)
+        text_offsets, text_bytes = encode_strings(self.text.values)
+        return [
+            ("record_count", "q", struct.pack("<{}q".format(rows), *self.record_count)),
+            ("breach_date", "i", struct.pack("<{}i".format(rows), *self.breach_date)),
+            ("index_date", "i", struct.pack("<{}i".format(rows), *self.index_date)),
+            ("dump_name.offsets", "I", dump_name_offsets),
+            ("dump_name.data", "B", dump_name_bytes),
+            ("source.codes", source_type, struct.pack("<{}{}".format(rows, source_type), *self.source)),
+            ("source.dictionary.offsets", "I", source_offsets),
+            ("source.dictionary.data", "B", source_bytes),
+            ("info.codes", text_type, struct.pack("<{}{}".format(rows, text_type), *self.info)),
+            ("description.codes", text_type, struct.pack("<{}{}".format(rows, text_type), *self.description)),
+            ("text.dictionary.offsets", "I", text_offsets),
+            ("text.dictionary.data", "B", text_bytes),
+        ]
+
+    def close(self):
+        rows = len(self.record_count)
+        write_sections(self.path, MAGIC, {"rows": rows}, self.sections())
+        logging.info("Written %d breaches to %s (%d bytes)", rows, self.path, os.path.getsize(self.path))
+
+def write_sections(path, magic, header, sections):
+    """
+    Writes a file made of magic, a uint32 header length, the JSON header and the (name, element type, bytes)
+    sections, each aligned to 8 bytes. The offset, length and type of every section are added to the header.
+    """
+    header = dict(header, sections={})
+    # the offsets depend on the header length, which depends on the offsets, so grow the header until it fits
+    header_size = 4096
+    while True:
+        offset = header_size
+        for name, element_type, data in sections:
+            header["sections"][name] = {"offset": offset, "length": len(data), "type": element_type}
+            offset += len(data) + (-len(data) % ALIGNMENT)
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        if len(magic) + 4 + len(encoded) <= header_size:
+            break
+        header_size *= 2
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<I", len(encoded)))
+        f.write(encoded)
+        f.write(b"\0" * (header_size - len(magic) - 4 - len(encoded)))
+        for name, element_type, data in sections:
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(tmp_path, path)
+
+def map_sections(path, magic):
+    """
+    Memory-maps a file written by write_sections(), returns its header and a function returning a section by name
+    as a memoryview of its element type. On big-endian machines the numeric sections are copied and byte-swapped
+    instead of being viewed in place.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    if bytes(view[:len(magic)]) != magic:
+        raise ValueError("{} is not a {} file".format(path, magic.rstrip(b"\0").decode()))
+    header_length = struct.unpack_from("<I", view, len(magic))[0]
+    header = json.loads(bytes(view[len(magic) + 4:len(magic) + 4 + header_length]))
+
+    def section(name):
+        spec = header["sections"][name]
+        data = view[spec["offset"]:spec["offset"] + spec["length"]]
+        if spec["type"] == "B":
+            return data
+        if sys.byteorder != "little":
+            values = array.array(spec["type"], data)
+            values.byteswap()
+            return memoryview(values)
+        return data.cast(spec["type"])
+
+    return header, section
+
+class StringColumn:
+    """
+    Read-only sequence of strings backed by an offsets array and a UTF-8 blob, strings are decoded on access.
+    """
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8", "surrogatepass")
+
+class DictionaryColumn:
+    """
+    Read-only sequence of dictionary encoded strings, codes holds the raw codes for vectorised use.
+    """
+    def __init__(self, codes, dictionary, nullable=False):
+        self.codes = codes
+        self.dictionary = [dictionary[i] for i in range(len(dictionary))]
+        if nullable:
+            self.dictionary[0] = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.dictionary[self.codes[index]]
+
+def load_columns(path):
+    """
+    Memory-maps a columnar export, returns a dict of column name -> sequence. Numeric columns are memoryviews over
+    the file, string columns decode values on access.
+    """
+    header, section = map_sections(path, MAGIC)
+    text = StringColumn(section("text.dictionary.offsets"), section("text.dictionary.data"))
+    return {
+        "record_count": section("record_count"),
+        "breach_date": section("breach_date"),
+        "index_date": section("index_date"),
+        "dump_name": StringColumn(section("dump_name.offsets"), section("dump_name.data")),
+        "source": DictionaryColumn(section("source.codes"), StringColumn(section("source.dictionary.offsets"), section("source.dictionary.data"))),
+        "info": DictionaryColumn(section("info.codes"), text, nullable=True),
+        "description": DictionaryColumn(section("description.codes"), text, nullable=True),
+    }
@@ -0,0 +1,108 @@
+import json, os, logging, traceback
+
+
+"""
+Streaming builder for combined.json. Datasets are consumed one at a time, every record is whitelisted in place and
+written to the output as soon as it is read, so the combined corpus is never held in memory.
+"""
+
+# files in datasets/ produced by the combine stage, which must never be loaded back as datasets
+GENERATED_FILES = ["combined.json", "stats.json", "entities.json"]
+WHITELIST = ["dump_name","breach_date","record_count","info","index_date","description","source"]
+PROGRESS_EVERY = 50000
+# json.dumps() builds a new encoder on every call when separators are given, share one instead
+ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def clean_record(breach):
+    """
+    Strips any key/value pairs where the key is not in the whitelist, in place.
+    """
+    for key in [key for key in breach if key not in WHITELIST]:
+        del breach[key]
+    return breach
+
+def iter_static_datasets(directory, ignore, cache=None):
+    """
+    Yields a (dataset, breaches) pair for every JSON file in directory that isn't in ignore, loading the files one
+    at a time as they are consumed. The source of each breach is set to the dataset's name. With a cache (see
+    archive_cache.py) the files are loaded through it, already cleaned.
+    """
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".json") or file in ignore:
+            continue
+        dataset = file.replace(".json","")
+        logging.info("Loading %s", file)
+        try:
+            if cache is not None:
+                breaches = cache.load(os.path.join(directory, file), dataset)
+            else:
+                with open(os.path.join(directory, file), "r") as f:
+                    breaches = json.load(f)
+                for breach in breaches:
+                    breach["source"] = dataset
+        except Exception as e:
+            logging.error('Error occurred while loading %s: %s', file, str(e))
+            logging.error('Traceback: %s', traceback.format_exc())
+            continue
+        yield dataset, breaches
+
+def iter_records(sources):
+    """
+    Flattens (dataset, breaches) pairs into cleaned (dataset, breach) pairs.
+    """
+    for dataset, breaches in sources:
+        for breach in breaches:
+            yield dataset, clean_record(breach)
+
+def write_combined(sources, path, consumers=()):
+    """
+    Writes the breaches of every (dataset, breaches) pair in sources to path as a single compact JSON array.
+    Every cleaned breach is also passed to consumer.add(dataset, breach) for each of the consumers, which are
+    closed once all breaches have been written. Returns a summary with the total rows and bytes written and the
+    rows written per dataset.
+
+    The array is written to a temporary file that only replaces path once complete. If anything fails, the
+    temporary file is removed and the consumers not closed yet are aborted with consumer.abort(), for the ones
+    that have one, so they can remove their own temporary files.
+    """
+    summary = {"rows": 0, "bytes": 0, "datasets": {}}
+    tmp_path = path + ".tmp"
+    remaining = list(consumers)
+    try:
+        with open(tmp_path, "w") as f:
+            f.write("[")
+            summary["bytes"] += 1
+            for dataset, breach in iter_records(sources):
+                data = ENCODER.encode(breach)
+                if summary["rows"]:
+                    data = "," + data
+                f.write(data)
+                for consumer in consumers:
+                    consumer.add(dataset, breach)
+                summary["rows"] += 1
+                summary["bytes"] += len(data)
+                summary["datasets"][dataset] = summary["datasets"].get(dataset, 0) + 1
+                if summary["rows"] % PROGRESS_EVERY == 0:
+                    logging.info("Written %d breaches (%d bytes) to %s", summary["rows"], summary["bytes"], path)
+            f.write("]")
+            summary["bytes"] += 1
+        os.replace(tmp_path, path)
+        while remaining:
+            remaining[0].close()
+            remaining.pop(0)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        for consumer in remaining:
+            abort = getattr(consumer, "abort", None)
+            if abort is None:
+                continue
+            try:
+                abort()
+            except Exception as e:
+                logging.error("Error occurred while aborting %s: %s", type(consumer).__name__, str(e))
+        raise
+    for dataset, rows in summary["datasets"].items():
+        logging.debug("Combined %d breaches from %s", rows, dataset)
+    logging.info("Written %d breaches (%d bytes) to %s", summary["rows"], summary["bytes"], path)
+    return summary
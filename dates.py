@@ -0,0 +1,66 @@
+import re
+
+
+"""
+Normalization of the breach date formats found in the datasets, shared by the stats, the entities and the columnar
+export so they all agree on what a date is. Dates are normalized to YYYYMMDD ints (0 when unknown), which sort
+chronologically, and formatted back as YYYY, YYYY-MM or YYYY-MM-DD.
+"""
+
+MONTHS = {month: number for number, month in enumerate(["jan","feb","mar","apr","may","jun","jul","aug","sep","oct","nov","dec"], 1)}
+ISO_DATE = re.compile(r"^(\d{4})(?:[-/.](\d{1,2})(?:[-/.](\d{1,2}))?)?(?:$|[T\s])")
+DAY_FIRST_DATE = re.compile(r"^(\d{1,2}|\?\?)([-/.])(\d{1,2}|\?\?)\2(\d{4})$")
+MONTH_YEAR_DATE = re.compile(r"^(\d{1,2})[/.](\d{4})$")
+MONTH_NAME_DATE = re.compile(r"^([A-Za-z]{3})[a-z]*\s*-?\s*(\d{4})$")
+
+def date_to_int(year, month=0, day=0):
+    if not 1970 <= year <= 2100:
+        return 0
+    if not 1 <= month <= 12:
+        return year * 10000
+    if not 1 <= day <= 31:
+        day = 0
+    return year * 10000 + month * 100 + day
+
+def normalize_date(value):
+    """
+    Normalizes the date formats found in the datasets (2015, 2015-03, 2020-11-23T00:00:00Z, 26/02/2020, 01-07-2025,
+    12/2019, Mar - 2018, ...) to a YYYYMMDD int, returns 0 when the value isn't a recognisable date. Day first dates
+    whose month can't be one (01/17/2017) are read month first.
+    """
+    if type(value) == int:
+        return date_to_int(value)
+    if not isinstance(value, str):
+        return 0
+    value = value.strip()
+    match = ISO_DATE.match(value)
+    if match:
+        return date_to_int(int(match.group(1)), int(match.group(2) or 0), int(match.group(3) or 0))
+    match = DAY_FIRST_DATE.match(value)
+    if match:
+        day, _, month, year = match.groups()
+        day = int(day) if day.isdigit() else 0
+        month = int(month) if month.isdigit() else 0
+        if month > 12 and 1 <= day <= 12:
+            day, month = month, day
+        return date_to_int(int(year), month, day)
+    match = MONTH_YEAR_DATE.match(value)
+    if match:
+        return date_to_int(int(match.group(2)), int(match.group(1)))
+    match = MONTH_NAME_DATE.match(value)
+    if match and match.group(1).lower() in MONTHS:
+        return date_to_int(int(match.group(2)), MONTHS[match.group(1).lower()])
+    return 0
+
+def format_date(value):
+    """
+    Formats a YYYYMMDD int from normalize_date() as YYYY, YYYY-MM or YYYY-MM-DD, None when the date is unknown.
+    """
+    if not value:
+        return None
+    year, month, day = value // 10000, value // 100 % 100, value % 100
+    if not month:
+        return "{:04d}".format(year)
+    if not day:
+        return "{:04d}-{:02d}".format(year, month)
+    return "{:04d}-{:02d}-{:02d}".format(year, month, day)
@@ -0,0 +1,118 @@
+import json, os, re, shutil, time
+
+
+"""
+Change detection between two snapshots of a provider's breaches. Records are keyed by (source, dump_name), the
+differences are appended to an NDJSON delta log so consumers can sync only what changed since their last run.
+The log is rotated daily, one <directory>/YYYY-MM-DD.ndjson file per UTC day, and the files older than
+RETENTION_DAYS are removed, so a consumer must sync at least that often or fall back to the full datasets. Appends
+rewrite the day's file to a temporary file that replaces it once complete, so an interrupted run never leaves a
+partial line behind.
+
+Every line of the log is one change:
+    {"ts": 1729209600, "dataset": "Dehashed", "op": "add", "key": [source, dump_name], "record": {...}}
+    {"ts": 1729209600, "dataset": "Dehashed", "op": "remove", "key": [source, dump_name]}
+    {"ts": 1729209600, "dataset": "Dehashed", "op": "change", "key": [source, dump_name], "fields": {field: [old, new]}}
+"change" lines only carry the fields that changed, a field missing from either record is null.
+"""
+
+DEFAULT_DIRECTORY = "datasets/delta"
+RETENTION_DAYS = 30
+LOG_FILE = re.compile(r"^\d{4}-\d{2}-\d{2}\.ndjson$")
+
+def record_key(breach):
+    return (breach.get("source"), breach.get("dump_name"))
+
+def index_records(breaches):
+    """
+    Indexes breaches by (source, dump_name, n), n tells apart records sharing the same source and dump_name.
+    """
+    index = {}
+    seen = {}
+    for breach in breaches:
+        key = record_key(breach)
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        index[key + (n,)] = breach
+    return index
+
+def diff_records(old, new):
+    """
+    Returns the added, removed and changed records between two lists of breaches as a dict of lists, changed
+    records are (old, new) pairs.
+    """
+    old_index = index_records(old)
+    new_index = index_records(new)
+    changes = {"added": [], "removed": [], "changed": []}
+    for key, breach in new_index.items():
+        if key not in old_index:
+            changes["added"].append(breach)
+        elif old_index[key] != breach:
+            changes["changed"].append((old_index[key], breach))
+    for key, breach in old_index.items():
+        if key not in new_index:
+            changes["removed"].append(breach)
+    return changes
+
+def has_changes(changes):
+    return any(changes.values())
+
+def load_snapshot(path):
+    """
+    Loads the previous snapshot of a dataset, a missing or unreadable file is an empty snapshot.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def changed_fields(old, new):
+    """
+    Returns {field: [old value, new value]} for every field that differs between two records.
+    """
+    return {field: [old.get(field), new.get(field)] for field in sorted(set(old) | set(new)) if old.get(field) != new.get(field)}
+
+def log_path(directory, timestamp):
+    return os.path.join(directory, time.strftime("%Y-%m-%d", time.gmtime(timestamp)) + ".ndjson")
+
+def prune_logs(directory, timestamp, retention_days=RETENTION_DAYS):
+    """
+    Removes the daily logs older than retention_days before timestamp.
+    """
+    oldest = os.path.basename(log_path(directory, timestamp - retention_days * 24 * 60 * 60))
+    for file in os.listdir(directory):
+        if LOG_FILE.match(file) and file < oldest:
+            os.remove(os.path.join(directory, file))
+
+def append_delta(directory, dataset, changes, timestamp=None):
+    """
+    Appends the changes of a dataset to the day's delta log in directory, pruning the expired logs. Returns the
+    number of lines written.
+    """
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    lines = []
+    for breach in changes["added"]:
+        lines.append({"ts": timestamp, "dataset": dataset, "op": "add", "key": list(record_key(breach)), "record": breach})
+    for breach in changes["removed"]:
+        lines.append({"ts": timestamp, "dataset": dataset, "op": "remove", "key": list(record_key(breach))})
+    for old, breach in changes["changed"]:
+        lines.append({"ts": timestamp, "dataset": dataset, "op": "change", "key": list(record_key(breach)), "fields": changed_fields(old, breach)})
+    if lines:
+        os.makedirs(directory, exist_ok=True)
+        path = log_path(directory, timestamp)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                if os.path.exists(path):
+                    with open(path, "r") as previous:
+                        shutil.copyfileobj(previous, f)
+                for line in lines:
+                    f.write(json.dumps(line, separators=(',', ':')) + "\n")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        prune_logs(directory, timestamp)
+    return len(lines)
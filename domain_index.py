@@ -0,0 +1,217 @@
+import argparse, bisect, hashlib, json, os, re, struct, sys, logging
+import columnar, dates
+
+
+"""
+Reverse index from registrable domains to the breaches involving them (domains.idx), answering "which known breaches
+involve example.com" without scanning the datasets. Domains are extracted from every breach's dump_name (e.g.
+"linkedin.com", "HO[1188]__Shertonenglish.com", "http://www.isuzu.net.my + SQLi") and, for the datasets that keep
+the breached site there, from info. They are reduced to their registrable domain: lowercased, without subdomains,
+keeping a second label under a ccTLD when it is a generic one such as co.uk, com.au or go.th.
+
+The index holds the sorted 64-bit hashes of the domains, a directory of the first key of every 16-bit hash prefix,
+so a lookup only searches the few keys sharing its prefix, the domains themselves to rule out hash collisions, and
+for every domain the sorted rows of its breaches in combined.json (and combined.col, which the lookups read the
+breaches from). It uses the same layout as combined.col and is memory-mapped, so a lookup costs a few microseconds
+and nothing is loaded up front.
+
+    $ python domain_index.py build [--combined datasets/combined.json] [--output datasets/domains.idx]
+    $ python domain_index.py lookup example.com linkedin.com ...  # or --file domains.txt, one domain per line
+"""
+
+MAGIC = b"KBDOM1\0\0"
+DEFAULT_PATH = "datasets/domains.idx"
+DEFAULT_COMBINED = "datasets/combined.json"
+DEFAULT_COLUMNS = "datasets/combined.col"
+PREFIX_BITS = 16
+
+DOMAIN = re.compile(r"(?<![a-z0-9-])(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,24}(?![a-z0-9-]|\.[a-z0-9])")
+# second level labels under which ccTLDs register domains, e.g. co.uk, com.au, net.my, go.th
+GENERIC_SECOND_LEVEL = {"ac", "art", "biz", "co", "com", "edu", "go", "gob", "gov", "in", "info", "ltd", "mil", "mus", "ne", "net", "nic", "or", "org", "plc", "sch", "web"}
+# "domains" that are file names in the archived indexes (wrestle.sql, AnonIP's.txt, ...)
+FILE_EXTENSIONS = {"bak", "csv", "dat", "db", "doc", "docx", "dump", "exe", "gz", "htm", "html", "json", "log", "mdb", "pdf", "php", "rar", "sql", "sqlite", "tar", "tgz", "tsv", "txt", "xls", "xlsx", "xml", "xz", "zip"}
+# datasets whose info holds the breached site's domain or URL rather than free text, with the source the live
+# provider sets on its breaches ("9Ghz.com" for the 9Ghz dataset), so an index built from combined.json alone matches
+DOMAIN_INFO_DATASETS = {"9ghz", "9ghz.com", "leaked.domains"}
+
+def registrable_domain(host):
+    """
+    Reduces a lowercased host name to its registrable domain, returns None when it doesn't look like a domain.
+    """
+    labels = host.strip(".").split(".")
+    if len(labels) < 2 or labels[-1] in FILE_EXTENSIONS:
+        return None
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in GENERIC_SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def extract_domains(text):
+    """
+    Returns the registrable domains found in text, in order of appearance and without duplicates.
+    """
+    domains = []
+    for match in DOMAIN.finditer(str(text or "").lower()):
+        domain = registrable_domain(match.group(0))
+        if domain and domain not in domains:
+            domains.append(domain)
+    return domains
+
+def breach_domains(dataset, breach):
+    """
+    Returns the registrable domains a breach involves.
+    """
+    domains = extract_domains(breach.get("dump_name"))
+    if dataset.lower() in DOMAIN_INFO_DATASETS or str(breach.get("source") or "").lower() in DOMAIN_INFO_DATASETS:
+        domains += [domain for domain in extract_domains(breach.get("info")) if domain not in domains]
+    return domains
+
+def normalize_query(domain):
+    """
+    Normalizes a looked up domain, URL or host name the way the indexed domains were, None if it isn't one.
+    """
+    domains = extract_domains(domain.strip())
+    return domains[0] if domains else None
+
+def domain_key(domain):
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+class DomainIndexWriter:
+    """
+    combine.write_combined() consumer writing the domain index to path when closed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.postings = {}
+
+    def add(self, dataset, breach):
+        for domain in breach_domains(dataset, breach):
+            self.postings.setdefault(domain, []).append(self.rows)
+        self.rows += 1
+
+    def sections(self):
+        entries = sorted((domain_key(domain), domain) for domain in self.postings)
+        keys = [key for key, _ in entries]
+        prefixes = [key >> (64 - PREFIX_BITS) for key in keys]
+        directory = [bisect.bisect_left(prefixes, prefix) for prefix in range(2 ** PREFIX_BITS + 1)]
+        posting_offsets = [0]
+        postings = []
+        for _, domain in entries:
+            postings += self.postings[domain]
+            posting_offsets.append(len(postings))
+        domain_offsets, domain_bytes = columnar.encode_strings([domain for _, domain in entries])
+        return [
+            ("keys", "Q", struct.pack("<{}Q".format(len(keys)), *keys)),
+            ("directory", "I", struct.pack("<{}I".format(len(directory)), *directory)),
+            ("postings.offsets", "I", struct.pack("<{}I".format(len(posting_offsets)), *posting_offsets)),
+            ("postings", "I", struct.pack("<{}I".format(len(postings)), *postings)),
+            ("domains.offsets", "I", domain_offsets),
+            ("domains.data", "B", domain_bytes),
+        ]
+
+    def close(self):
+        columnar.write_sections(self.path, MAGIC, {"rows": self.rows, "domains": len(self.postings)}, self.sections())
+        logging.info("Written %d domains of %d breaches to %s (%d bytes)", len(self.postings), self.rows, self.path, os.path.getsize(self.path))
+
+class DomainIndex:
+    """
+    Memory-mapped domain index. lookup() returns the rows of the breaches involving a domain, records() the breaches
+    of rows from combined.col.
+    """
+    def __init__(self, path=DEFAULT_PATH, columns_path=DEFAULT_COLUMNS):
+        self.path = path
+        self.columns_path = columns_path
+        self.columns = None
+        header, section = columnar.map_sections(path, MAGIC)
+        self.rows = header["rows"]
+        self.keys = section("keys")
+        self.directory = section("directory")
+        self.posting_offsets = section("postings.offsets")
+        self.postings = section("postings")
+        self.domains = columnar.StringColumn(section("domains.offsets"), section("domains.data"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, domain):
+        """
+        Returns the rows of the breaches involving a domain (or any host under it), an empty list if there are none.
+        """
+        domain = normalize_query(domain)
+        if domain is None:
+            return []
+        key = domain_key(domain)
+        prefix = key >> (64 - PREFIX_BITS)
+        i = bisect.bisect_left(self.keys, key, self.directory[prefix], self.directory[prefix + 1])
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.domains[i] == domain:
+                return list(self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]])
+            i += 1
+        return []
+
+    def lookup_many(self, domains):
+        """
+        Returns a dict of domain -> rows for every domain in domains.
+        """
+        return {domain: self.lookup(domain) for domain in domains}
+
+    def records(self, rows):
+        """
+        Returns the breaches of rows as dicts read from combined.col, which must come from the same combine as the
+        index.
+        """
+        if self.columns is None:
+            columns = columnar.load_columns(self.columns_path)
+            if len(columns["record_count"]) != self.rows:
+                raise ValueError("{} and {} weren't built from the same combined.json".format(self.path, self.columns_path))
+            self.columns = columns
+        records = []
+        for row in rows:
+            record_count = self.columns["record_count"][row]
+            records.append({
+                "dump_name": self.columns["dump_name"][row],
+                "source": self.columns["source"][row],
+                "breach_date": dates.format_date(self.columns["breach_date"][row]),
+                "record_count": None if record_count < 0 else record_count,
+            })
+        return records
+
+def build(combined_path=DEFAULT_COMBINED, path=DEFAULT_PATH):
+    """
+    Builds the domain index from an existing combined.json.
+    """
+    with open(combined_path, "r") as f:
+        breaches = json.load(f)
+    writer = DomainIndexWriter(path)
+    for breach in breaches:
+        writer.add(breach.get("source") or "", breach)
+    writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds or queries the domain to breach index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build the index from combined.json")
+    build_parser.add_argument("--combined", default=DEFAULT_COMBINED, help="combined dataset to index (default: %(default)s)")
+    build_parser.add_argument("--output", default=DEFAULT_PATH, help="index file (default: %(default)s)")
+    lookup_parser = subparsers.add_parser("lookup", help="print the breaches involving domains as JSON lines")
+    lookup_parser.add_argument("domains", nargs="*", help="domains, host names or URLs to look up")
+    lookup_parser.add_argument("--file", help="file listing domains to look up, one per line (- for stdin)")
+    lookup_parser.add_argument("--index", default=DEFAULT_PATH, help="index file (default: %(default)s)")
+    lookup_parser.add_argument("--columns", default=DEFAULT_COLUMNS, help="columnar export the breaches are read from (default: %(default)s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    if args.command == "build":
+        build(args.combined, args.output)
+    else:
+        domains = list(args.domains)
+        if args.file:
+            f = sys.stdin if args.file == "-" else open(args.file, "r")
+            with f:
+                domains += [line.strip() for line in f if line.strip()]
+        index = DomainIndex(args.index, args.columns)
+        for domain, rows in index.lookup_many(domains).items():
+            print(json.dumps({"domain": domain, "breaches": index.records(rows)}))
@@ -0,0 +1,137 @@
+import json, os, re, difflib, logging
+from collections import Counter
+import dates, stats
+
+
+"""
+Resolves the breaches reported by the different providers into canonical breach entities, e.g. HaveIBeenPwned's
+"LinkedIn", Leak-Lookup's "linkedin.com" and Dehashed's "LinkedIn 2012" become a single entity. Names are
+normalized into a key, records sharing a key are merged, and near-identical keys are found with a sorted
+neighbourhood pass instead of comparing every pair. Only the entities with more than one record are saved, a single
+record is already its own entity in combined.json, and they list their members as row indices into combined.json
+rather than copying the records.
+"""
+
+# trailing domain suffixes stripped from names, the second level ones are listed first so they are removed whole
+TLD_SUFFIX = re.compile(r"\.(co\.uk|com\.au|com\.br|co\.jp|co\.kr|co\.in|com\.cn|com\.tr|com\.mx|org\.uk|net\.au|com|net|org|info|biz|io|co|me|us|uk|ca|au|de|fr|es|it|nl|pl|ru|su|ua|br|jp|cn|kr|in|tv|cc|gg|to|xyz|eu|ch|se|no|dk|fi|cz|sk|hu|ro|gr|pt|be|at|ir|vn|id|my|tw|hk|sg|ph|th|za|mx|ar|cl|pe|tk|ws|gov|edu)$")
+YEAR_SUFFIX = re.compile(r"[\s_\-.(\[]*(19[89]\d|20\d\d)[)\]]*$")
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+DIGITS = re.compile(r"\d+")
+
+# number of following keys each key is compared with in the sorted neighbourhood pass
+WINDOW = 4
+SIMILARITY = 0.95
+MIN_FUZZY_LENGTH = 6
+
+def normalize_name(name):
+    """
+    Normalizes a dump name into a matching key: lowercased, without www., trailing TLDs, a trailing year or any
+    punctuation. Names that would normalize to nothing are only lowercased.
+    """
+    name = str(name or "").strip().lower()
+    key = name
+    if key.startswith("www."):
+        key = key[4:]
+    key = YEAR_SUFFIX.sub("", key)
+    while True:
+        stripped = TLD_SUFFIX.sub("", key)
+        if stripped == key:
+            break
+        key = stripped
+    key = YEAR_SUFFIX.sub("", key)
+    key = NON_ALPHANUMERIC.sub("", key)
+    return key or NON_ALPHANUMERIC.sub("", name) or name
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+def similar_keys(a, b):
+    """
+    Returns True if two keys are close enough to be the same breach. Keys containing different numbers (e.g.
+    "collection1" and "collection2") never match.
+    """
+    if len(a) < MIN_FUZZY_LENGTH or len(b) < MIN_FUZZY_LENGTH:
+        return False
+    if DIGITS.findall(a) != DIGITS.findall(b):
+        return False
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return matcher.real_quick_ratio() >= SIMILARITY and matcher.quick_ratio() >= SIMILARITY and matcher.ratio() >= SIMILARITY
+
+def resolve(records):
+    """
+    Clusters (dump_name, source, record_count, breach_date) tuples into entities, returns a list of lists of
+    record indices.
+    """
+    keys = {}
+    for index, record in enumerate(records):
+        keys.setdefault(normalize_name(record[0]), []).append(index)
+    # every distinct key is a candidate entity, similar keys are merged by comparing each key with its neighbours
+    # in sorted order and in reversed-string sorted order, so both shared prefixes and shared suffixes are caught
+    distinct = list(keys)
+    clusters = UnionFind()
+    for ordering in (sorted(distinct), sorted(distinct, key=lambda key: key[::-1])):
+        for i, key in enumerate(ordering):
+            for other in ordering[i + 1:i + 1 + WINDOW]:
+                if similar_keys(key, other):
+                    clusters.union(key, other)
+    members = {}
+    for key in distinct:
+        members.setdefault(clusters.find(key), []).extend(keys[key])
+    return list(members.values())
+
+def build_entity(entity_id, records, indices):
+    names = Counter(records[index][0] for index in indices)
+    counts = [records[index][2] for index in indices if records[index][2] is not None]
+    breach_dates = [records[index][3] for index in indices if records[index][3]]
+    return {
+        "id": entity_id,
+        "name": names.most_common(1)[0][0],
+        "sources": sorted({records[index][1] for index in indices}),
+        "records_max": max(counts) if counts else None,
+        "records_min": min(counts) if counts else None,
+        "breach_date_min": dates.format_date(min(breach_dates)) if breach_dates else None,
+        "breach_date_max": dates.format_date(max(breach_dates)) if breach_dates else None,
+        "members": sorted(indices),
+    }
+
+class EntityResolver:
+    """
+    combine.write_combined() consumer resolving the combined breaches into entities, saved to path when closed.
+    Entities are sorted by the number of sources reporting them. Records are kept in the order they are added, so
+    their indices are their rows in combined.json.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+
+    def add(self, dataset, breach):
+        # breach dates are kept as dates.normalize_date() ints so they compare chronologically, 0 when unknown
+        self.records.append((str(breach.get("dump_name") or ""), breach.get("source") or dataset, stats.parse_record_count(breach.get("record_count")), dates.normalize_date(breach.get("breach_date"))))
+
+    def close(self):
+        clusters = resolve(self.records)
+        resolved = len(clusters)
+        clusters = [indices for indices in clusters if len(indices) > 1]
+        clusters.sort(key=lambda indices: (-len({self.records[index][1] for index in indices}), min(indices)))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("[")
+            for entity_id, indices in enumerate(clusters):
+                if entity_id:
+                    f.write(",\n")
+                f.write(json.dumps(build_entity(entity_id, self.records, indices), separators=(',', ':')))
+            f.write("]\n")
+        os.replace(tmp_path, self.path)
+        logging.info("Resolved %d breaches into %d entities, written the %d with several records to %s", len(self.records), resolved, len(clusters), self.path)
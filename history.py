@@ -0,0 +1,371 @@
+import argparse, json, os, pickle, subprocess, threading, time, logging
+import stats
+
+
+"""
+Append-only history of the live providers' indexes (history.bin), recording every run so questions like "when did
+Dehashed add this breach" or "how did the total records of a source grow" don't need the git history.
+
+Every provider run appends one segment listing what changed since the provider's previous run: the keys
+(source, dump_name) seen for the first time, the keys whose record count changed, as zigzag varint deltas of the
+previous count, and the keys that disappeared. Key ids are varint deltas in ascending order. A run without changes
+still appends a few bytes, recording that the keys were seen again. Records sharing a key have their counts added
+up. Each segment is prefixed with its length, so a segment cut short by a crash is detected and ignored.
+
+Decoding the file replays every segment into per-key events and per-source series. The decoded state is cached in
+.cache/history.pickle together with the length of the file it covers and the bytes ending it, so loading it only
+decodes the segments appended since, and the queries are dictionary lookups.
+
+    $ python history.py breach <source> <dump_name>  # per-breach record counts, first and last seen
+    $ python history.py source <dataset>             # per-run breach and record totals of a dataset
+    $ python history.py backfill                     # import the datasets' git history into an empty history
+"""
+
+MAGIC = b"KBHIST1\n"
+DEFAULT_PATH = "datasets/history.bin"
+DEFAULT_CACHE = ".cache/history.pickle"
+# bump when the decoded state changes, so caches written by older code are rebuilt
+STATE_VERSION = 1
+# bytes ending the decoded part of the file kept with the state, to tell whether the file still starts with it
+TAIL_BYTES = 64
+
+def encode_varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+def encode_string(value, out):
+    data = value.encode("utf-8", "surrogatepass")
+    encode_varint(len(data), out)
+    out += data
+
+def decode_string(data, offset):
+    length, offset = decode_varint(data, offset)
+    return bytes(data[offset:offset + length]).decode("utf-8", "surrogatepass"), offset + length
+
+def count_value(count):
+    # unknown counts are stored as -1 so they still delta-encode against known ones
+    return -1 if count is None else count
+
+def key_counts(breaches):
+    """
+    Returns the record count of every (source, dump_name) key of breaches, None when unknown. Counts of records
+    sharing a key are added up.
+    """
+    counts = {}
+    for breach in breaches:
+        key = (str(breach.get("source") or ""), str(breach.get("dump_name") or ""))
+        count = stats.parse_record_count(breach.get("record_count"))
+        if key in counts and (count is not None or counts[key] is not None):
+            count = (counts[key] or 0) + (count or 0)
+        counts[key] = count
+    return counts
+
+def new_state():
+    return {
+        "version": STATE_VERSION,
+        "offset": len(MAGIC),
+        "tail": MAGIC,
+        "timestamp": 0,
+        # key id -> (source, dump_name), and back
+        "keys": [],
+        "ids": {},
+        # key id -> current count value (see count_value()) of the keys currently present
+        "values": {},
+        # key id -> dataset whose runs report the key
+        "datasets": {},
+        # key id -> [(timestamp, record count or None, present)]
+        "events": {},
+        # key id -> timestamp of the last run that reported the key, for keys that disappeared
+        "last_seen": {},
+        # dataset -> set of key ids currently present, and their total known record count
+        "present": {},
+        "totals": {},
+        # dataset -> [(timestamp, breaches, total records)], one entry per run
+        "series": {},
+    }
+
+class History:
+    """
+    Reader and writer of the history file at path. The state is loaded on first use, record() appends a run.
+    """
+    def __init__(self, path=DEFAULT_PATH, cache_path=DEFAULT_CACHE):
+        self.path = path
+        self.cache_path = cache_path
+        self.state = None
+        # size of the file when it was last decoded, which is past the state when it ends with an incomplete segment
+        self.size = None
+        self.lock = threading.RLock()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning("Ignoring unreadable history cache %s: %s", self.cache_path, str(e))
+        return None
+
+    def _save_cache(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.cache_path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
+
+    def load(self):
+        """
+        Returns the decoded state, decoding only the segments appended since the cached state.
+        """
+        with self.lock:
+            if self.state is not None and os.path.exists(self.path) and os.path.getsize(self.path) == self.size:
+                return self.state
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = MAGIC
+            if not data.startswith(MAGIC):
+                raise ValueError("{} is not a history file".format(self.path))
+            state = self.state or self._load_cache()
+            # the cache only applies to the file it was decoded from, i.e. when the file was only appended to since
+            if state is None or data[max(0, state["offset"] - TAIL_BYTES):state["offset"]] != state["tail"]:
+                state = new_state()
+            self.state = state
+            self.size = len(data)
+            if state["offset"] < len(data):
+                view = memoryview(data)
+                offset = state["offset"]
+                while offset < len(data):
+                    try:
+                        length, start = decode_varint(view, offset)
+                    except IndexError:
+                        length, start = None, len(data)
+                    if length is None or start + length > len(data):
+                        logging.warning("Ignoring the incomplete last segment of %s", self.path)
+                        break
+                    self._apply(view[start:start + length])
+                    offset = start + length
+                state["offset"] = offset
+                state["tail"] = data[max(0, offset - TAIL_BYTES):offset]
+                self._save_cache()
+            return state
+
+    def _apply(self, segment):
+        """
+        Replays a segment into the state.
+        """
+        state = self.state
+        offset = 0
+        delta, offset = decode_varint(segment, offset)
+        timestamp = state["timestamp"] + unzigzag(delta)
+        state["timestamp"] = timestamp
+        dataset, offset = decode_string(segment, offset)
+        present = state["present"].setdefault(dataset, set())
+        total = state["totals"].get(dataset, 0)
+        values = state["values"]
+        events = state["events"]
+        new_keys, offset = decode_varint(segment, offset)
+        for _ in range(new_keys):
+            source, offset = decode_string(segment, offset)
+            dump_name, offset = decode_string(segment, offset)
+            state["ids"][(source, dump_name)] = len(state["keys"])
+            state["keys"].append((source, dump_name))
+        updates, offset = decode_varint(segment, offset)
+        key_id = 0
+        for _ in range(updates):
+            delta, offset = decode_varint(segment, offset)
+            key_id += delta
+            delta, offset = decode_varint(segment, offset)
+            if key_id in present:
+                total -= max(values[key_id], 0)
+            value = values.get(key_id, 0) + unzigzag(delta)
+            values[key_id] = value
+            total += max(value, 0)
+            present.add(key_id)
+            state["datasets"][key_id] = dataset
+            state["last_seen"].pop(key_id, None)
+            events.setdefault(key_id, []).append((timestamp, None if value < 0 else value, True))
+        removals, offset = decode_varint(segment, offset)
+        key_id = 0
+        previous_run = state["series"][dataset][-1][0] if state["series"].get(dataset) else timestamp
+        for _ in range(removals):
+            delta, offset = decode_varint(segment, offset)
+            key_id += delta
+            total -= max(values.pop(key_id), 0)
+            present.discard(key_id)
+            state["last_seen"][key_id] = previous_run
+            events.setdefault(key_id, []).append((timestamp, None, False))
+        state["totals"][dataset] = total
+        state["series"].setdefault(dataset, []).append((timestamp, len(present), total))
+
+    def encode_run(self, dataset, breaches, timestamp):
+        """
+        Returns the segment recording a run of dataset that returned breaches, against the current state.
+        """
+        state = self.load()
+        counts = key_counts(breaches)
+        new_keys = [key for key in counts if key not in state["ids"]]
+        new_ids = {key: len(state["keys"]) + i for i, key in enumerate(new_keys)}
+        present = state["present"].get(dataset, set())
+        updates = []
+        current = set()
+        for key, count in counts.items():
+            key_id = state["ids"].get(key, new_ids.get(key))
+            current.add(key_id)
+            value = count_value(count)
+            if key_id not in present or state["values"].get(key_id) != value:
+                updates.append((key_id, value - state["values"].get(key_id, 0)))
+        removals = sorted(present - current)
+        payload = bytearray()
+        encode_varint(zigzag(int(timestamp) - state["timestamp"]), payload)
+        encode_string(dataset, payload)
+        encode_varint(len(new_keys), payload)
+        for source, dump_name in new_keys:
+            encode_string(source, payload)
+            encode_string(dump_name, payload)
+        encode_varint(len(updates), payload)
+        previous = 0
+        for key_id, delta in sorted(updates):
+            encode_varint(key_id - previous, payload)
+            encode_varint(zigzag(delta), payload)
+            previous = key_id
+        encode_varint(len(removals), payload)
+        previous = 0
+        for key_id in removals:
+            encode_varint(key_id - previous, payload)
+            previous = key_id
+        segment = bytearray()
+        encode_varint(len(payload), segment)
+        return bytes(segment + payload)
+
+    def record(self, dataset, breaches, timestamp=None):
+        """
+        Appends a run of dataset that returned breaches. Returns the number of bytes appended.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        with self.lock:
+            segment = self.encode_run(dataset, breaches, timestamp)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                elif f.tell() != self.state["offset"]:
+                    # drop an incomplete segment left by a crash, it would corrupt everything appended after it
+                    f.truncate(self.state["offset"])
+                f.write(segment)
+                f.flush()
+                os.fsync(f.fileno())
+            # the state follows the appended segment, the cache is brought up to date by the next load()
+            length, start = decode_varint(segment, 0)
+            self._apply(memoryview(segment)[start:])
+            self.state["offset"] += len(segment)
+            self.size = self.state["offset"]
+            self.state["tail"] = (self.state["tail"] + segment)[-TAIL_BYTES:]
+        return len(segment)
+
+    def breach(self, source, dump_name):
+        """
+        Returns the history of a breach: the dataset reporting it, first and last seen timestamps (last seen is None
+        while it is still reported) and its events as (timestamp, record count, present), or None if it was never seen.
+        """
+        state = self.load()
+        key_id = state["ids"].get((source, dump_name))
+        if key_id is None or key_id not in state["events"]:
+            return None
+        events = state["events"][key_id]
+        return {
+            "source": source,
+            "dump_name": dump_name,
+            "dataset": state["datasets"].get(key_id),
+            "first_seen": events[0][0],
+            "last_seen": state["last_seen"].get(key_id),
+            "record_count": events[-1][1] if events[-1][2] else None,
+            "events": [list(event) for event in events],
+        }
+
+    def source(self, dataset):
+        """
+        Returns the runs of a dataset as (timestamp, breaches, total records), oldest first.
+        """
+        return [list(run) for run in self.load()["series"].get(dataset, [])]
+
+    def datasets(self):
+        return sorted(self.load()["series"])
+
+def git_snapshots(path):
+    """
+    Yields (commit timestamp, breaches) for every commit that changed the file at path, oldest first.
+    """
+    commits = subprocess.run(["git", "log", "--reverse", "--format=%H %ct", "--", path], capture_output=True, text=True, check=True).stdout.split()
+    for commit, timestamp in zip(commits[::2], commits[1::2]):
+        try:
+            data = subprocess.run(["git", "show", "{}:{}".format(commit, path)], capture_output=True, check=True).stdout
+            yield int(timestamp), json.loads(data)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            logging.warning("Skipping %s at %s: %s", path, commit, str(e))
+
+def backfill(history, datasets, directory="datasets"):
+    """
+    Records the git history of every dataset's file into an empty history, oldest run first.
+    """
+    if history.datasets():
+        raise ValueError("{} already has runs, backfilling it would record them out of order".format(history.path))
+    runs = []
+    for dataset in datasets:
+        for timestamp, breaches in git_snapshots("{}/{}.json".format(directory, dataset)):
+            runs.append((timestamp, dataset, breaches))
+    runs.sort(key=lambda run: run[:2])
+    for timestamp, dataset, breaches in runs:
+        history.record(dataset, breaches, timestamp)
+    logging.info("Backfilled %d runs into %s", len(runs), history.path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queries or backfills the history of the live providers' indexes.")
+    parser.add_argument("--history", default=DEFAULT_PATH, help="history file (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    breach_parser = subparsers.add_parser("breach", help="print the history of a breach")
+    breach_parser.add_argument("source")
+    breach_parser.add_argument("dump_name")
+    source_parser = subparsers.add_parser("source", help="print the per-run totals of a dataset")
+    source_parser.add_argument("dataset")
+    subparsers.add_parser("backfill", help="import the live datasets' git history into an empty history")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    history = History(args.history)
+    if args.command == "breach":
+        print(json.dumps(history.breach(args.source, args.dump_name), indent=1))
+    elif args.command == "source":
+        print(json.dumps(history.source(args.dataset), indent=1))
+    else:
+        import scraper
+        backfill(history, [provider["output"] for provider in scraper.PROVIDERS])
@@ -0,0 +1,184 @@
+import hashlib, json, os, threading, logging
+import requests
+
+
+"""
+On-disk HTTP response cache using conditional requests. Responses carrying an ETag or Last-Modified header are stored
+with their validators, the next request for the same URL sends If-None-Match/If-Modified-Since and a 304 is answered
+from the stored body. Results parsed from a cached body can be stored next to it so unchanged pages aren't re-parsed.
+"""
+
+DEFAULT_CACHE_DIR = ".cache/http"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024 # 256MB
+
+class ResponseCache:
+    """
+    Size-bounded store of response bodies and their validators, the least recently used entries are evicted first.
+    Each entry is made of <key>.meta.json, <key>.body and optionally one <key>.<parser>.json per stored parse result.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+
+    def _path(self, url, suffix):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, "{}.{}".format(key, suffix))
+
+    def _write(self, path, data):
+        # write to a temporary file first so an interrupted run never leaves a truncated entry behind
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url):
+        """
+        Returns the stored metadata for a URL, or None if it isn't cached.
+        """
+        try:
+            with open(self._path(url, "meta.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url, response):
+        """
+        Stores a 200 response if it carries a validator.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": response.encoding,
+            "headers": {key: value for key, value in response.headers.items() if key.lower() in ("content-type", "etag", "last-modified")},
+        }
+        with self.lock:
+            self._write(self._path(url, "body"), response.content)
+            self._write(self._path(url, "meta.json"), json.dumps(meta).encode())
+            self._evict()
+
+    def response(self, url, meta, not_modified):
+        """
+        Builds a 200 response for a URL from the stored body, using the 304 response for everything but the content.
+        """
+        path = self._path(url, "body")
+        with open(path, "rb") as f:
+            content = f.read()
+        # mark the entry as recently used
+        os.utime(self._path(url, "meta.json"))
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response._content = content
+        response.headers.update(meta["headers"])
+        response.headers.update({key: value for key, value in not_modified.headers.items() if key.lower() not in ("content-length", "content-encoding", "transfer-encoding")})
+        response.encoding = meta["encoding"]
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.history = not_modified.history
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+    def get_parsed(self, url, name):
+        """
+        Returns the result stored by set_parsed() for the current body of a URL, or None.
+        """
+        meta = self.lookup(url)
+        if not meta:
+            return None
+        try:
+            with open(self._path(url, "{}.json".format(name)), "r") as f:
+                parsed = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if parsed["validator"] != [meta["etag"], meta["last_modified"]]:
+            return None
+        return parsed["result"]
+
+    def set_parsed(self, url, name, result):
+        """
+        Stores a JSON serializable parse result for the current body of a URL.
+        """
+        meta = self.lookup(url)
+        if not meta:
+            return
+        with self.lock:
+            self._write(self._path(url, "{}.json".format(name)), json.dumps({"validator": [meta["etag"], meta["last_modified"]], "result": result}).encode())
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes. Must be called with the lock held.
+        """
+        entries = {}
+        total = 0
+        for file in os.listdir(self.directory):
+            path = os.path.join(self.directory, file)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = entries.setdefault(file.split(".")[0], {"size": 0, "used": 0, "files": []})
+            entry["size"] += stat.st_size
+            entry["files"].append(path)
+            if file.endswith(".meta.json"):
+                entry["used"] = stat.st_mtime
+            total += stat.st_size
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            logging.debug("Evicting %s from the HTTP cache", key)
+            for path in entry["files"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= entry["size"]
+
+class CachedSession(requests.Session):
+    """
+    requests.Session that revalidates GET requests against a ResponseCache. Responses have a from_cache attribute
+    which is True when the body came from the cache after a 304, and a cache_key attribute for cached requests.
+    """
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache
+
+    def request(self, method, url, **kwargs):
+        cache = self.cache
+        if method.upper() != "GET" or cache is None or not cache.enabled or kwargs.get("stream"):
+            response = super().request(method, url, **kwargs)
+            response.from_cache = False
+            return response
+        key = requests.Request(method, url, params=kwargs.get("params")).prepare().url
+        meta = cache.lookup(key)
+        if meta:
+            headers = dict(kwargs.pop("headers", None) or {})
+            if meta["etag"]:
+                headers.setdefault("If-None-Match", meta["etag"])
+            if meta["last_modified"]:
+                headers.setdefault("If-Modified-Since", meta["last_modified"])
+            kwargs["headers"] = headers
+        response = super().request(method, url, **kwargs)
+        if response.status_code == 304 and meta:
+            try:
+                response = cache.response(key, meta, response)
+                response.cache_key = key
+                return response
+            except OSError:
+                # the body was evicted by another thread, fetch it again without validators
+                kwargs["headers"] = {name: value for name, value in kwargs["headers"].items() if name not in ("If-None-Match", "If-Modified-Since")}
+                response = super().request(method, url, **kwargs)
+        if response.status_code == 200:
+            cache.store(key, response)
+        response.from_cache = False
+        response.cache_key = key
+        return response
@@ -1,71 +1,156 @@
-let db;
+// URL of a query_service.py /search endpoint, searches are answered by it instead of downloading the database
+const QUERY_ENDPOINT = null;
+// The in-browser database lives in worker.js, see there for the messages it answers
+let worker;
+let nextRequest = 0;
+const pendingRequests = new Map();
 
-async function initDB() {
-    // Initialize SQL.js
-    const SQL = await initSqlJs({
-        locateFile: file => `https://sql.js.org/dist/${file}`
+function request(type, fields) {
+    // Posts a request to the worker, the returned promise settles with its answer
+    return new Promise((resolve, reject) => {
+        const id = nextRequest++;
+        pendingRequests.set(id, {resolve, reject});
+        worker.postMessage(Object.assign({id, type}, fields));
     });
-    
-    db = new SQL.Database();
-    
-    // Create table structure
-    db.run(`CREATE TABLE IF NOT EXISTS breaches (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        record_count INTEGER,
-        dump_name TEXT,
-        breach_date TEXT,
-        info TEXT,
-        source TEXT
-    )`);
-    
-    // Load data
-    await getDatasets();
 }
 
-async function getDatasets() {
+function onWorkerMessage(event) {
+    const message = event.data;
+    if (message.type === 'progress') {
+        showProgress(message);
+    } else if (message.type === 'rows') {
+        refreshTable();
+    } else if (pendingRequests.has(message.id)) {
+        const pending = pendingRequests.get(message.id);
+        pendingRequests.delete(message.id);
+        if (message.error) {
+            pending.reject(new Error(message.error));
+        } else {
+            pending.resolve(message.result);
+        }
+    }
+}
+
+async function initDB() {
+    // Show the dataset summary while the database is loading
+    loadSummary();
+    
+    if (QUERY_ENDPOINT) {
+        showTable();
+        return;
+    }
+    
+    worker = new Worker('worker.js');
+    worker.onmessage = onWorkerMessage;
     try {
-        const response = await fetch("datasets/combined.json");
-        const data = await response.json();
-        
-        // Begin transaction for bulk insert
-        db.run("BEGIN TRANSACTION");
-        
-        const stmt = db.prepare(`
-            INSERT INTO breaches (record_count, dump_name, breach_date, info, source)
-            VALUES (?, ?, ?, ?, ?)
-        `);
-        
-        data.forEach(item => {
-            // Sanitize and provide default values for all fields
-            const record_count = parseInt(item.record_count) || 0;
-            const dump_name = item.dump_name || 'Unknown';
-            const breach_date = item.breach_date || 'N/A';
-            const info = item.info || 'N/A';
-            const source = item.source || 'Unknown';
-            
-            stmt.run([
-                record_count,
-                dump_name,
-                breach_date,
-                info,
-                source
-            ]);
-        });
-        
-        stmt.free();
-        db.run("COMMIT");
-        
-        // Initial table display
-        updateTable();
-        
-        // Initialize DataTables with server-side processing
-        initializeDataTable();
-        
+        // Breaches are searchable as soon as the worker inserted the first of them, the table is shown then
+        await request('init');
     } catch (error) {
+        clearTimeout(refreshTimer);
         console.error('Error loading data:', error);
         // Show error message to user
         const tableDiv = document.getElementById('breach_div');
         tableDiv.innerHTML = `<div class="alert alert-danger">Error loading data: ${error.message}</div>`;
+        return;
+    }
+    
+    clearTimeout(refreshTimer);
+    refreshTimer = null;
+    loadSummary();
+    showTable();
+}
+
+let tableShown = false;
+// While breaches are loading the table is refreshed at most once per REFRESH_INTERVAL, every refresh costs the
+// worker a count and a sorted query in between its inserts
+const REFRESH_INTERVAL = 2000; // milliseconds
+let refreshTimer = null;
+
+function refreshTable() {
+    if (!tableShown) {
+        showTable();
+    } else if (refreshTimer === null) {
+        refreshTimer = setTimeout(() => {
+            refreshTimer = null;
+            showTable();
+        }, REFRESH_INTERVAL);
+    }
+}
+
+function showTable() {
+    if (tableShown) {
+        // More breaches were loaded, refresh the current page and counts
+        $('#breach_table').DataTable().ajax.reload(null, false);
+        return;
+    }
+    tableShown = true;
+    
+    // Initial table display
+    updateTable();
+    
+    // Initialize DataTables with server-side processing
+    initializeDataTable();
+}
+
+function showProgress(progress) {
+    const format = new Intl.NumberFormat().format;
+    let text;
+    if (progress.total) {
+        text = `Loaded ${format(progress.rows)} of ${format(progress.total)} breaches...`;
+    } else if (progress.totalBytes) {
+        text = `Loaded ${format(progress.rows)} breaches (${Math.floor(100 * progress.bytes / progress.totalBytes)}%)...`;
+    } else if (progress.rows) {
+        text = `Loaded ${format(progress.rows)} breaches...`;
+    } else {
+        text = `Loaded ${format(Math.round(progress.bytes / 1024))} KB of the database...`;
+    }
+    document.getElementById('breach_summary').textContent = text;
+}
+
+async function loadSummary() {
+    try {
+        const response = await fetch("datasets/stats.json");
+        if (!response.ok) {
+            return;
+        }
+        const stats = await response.json();
+        const format = new Intl.NumberFormat().format;
+        const sources = Object.keys(stats.datasets).length;
+        document.getElementById('breach_summary').textContent =
+            `${format(stats.breaches)} breaches from ${format(sources)} sources, ${format(stats.total_records)} records in total.`;
+    } catch (error) {
+        console.warn('Unable to load dataset statistics:', error);
+    }
+}
+
+function formatRow(row) {
+    return [
+        new Intl.NumberFormat().format(row[0]),
+        row[1],
+        row[2],
+        row[3],
+        row[4]
+    ];
+}
+
+// DataTables ajax handler answering from the in-browser database
+async function localQuery(data, callback, settings) {
+    try {
+        const result = await request('query', {request: {
+            search: data.search.value,
+            order: data.order,
+            start: data.start,
+            length: data.length
+        }});
+        callback({
+            draw: data.draw,
+            recordsTotal: result.recordsTotal,
+            recordsFiltered: result.recordsFiltered,
+            data: result.data.map(formatRow)
+        });
+    } catch (error) {
+        console.error('Error searching breaches:', error);
+        callback({draw: data.draw, recordsTotal: 0, recordsFiltered: 0, data: [], error: error.message});
     }
 }
 
@@ -75,73 +160,14 @@ function initializeDataTable() {
         processing: true,
         pageLength: 25,
         order: [[0, 'desc']], // Default sort by record count descending
-        ajax: function(data, callback, settings) {
-            // Get current page, search term, and sort info
-            const searchTerm = data.search.value;
-            const page = data.start / data.length + 1;
-            const pageSize = data.length;
-            
-            // Handle sorting
-            const sortColumn = data.order.map(order => {
-                const columnIndex = order.column;
-                const columnName = [
-                    'record_count',
-                    'dump_name',
-                    'breach_date',
-                    'info',
-                    'source'
-                ][columnIndex];
-                const direction = order.dir.toUpperCase();
-                return `${columnName} ${direction}`;
-            }).join(', ');
-            
-            // Build SQL query
-            let whereClause = searchTerm ? 
-                `WHERE dump_name LIKE '%${searchTerm}%' 
-                OR info LIKE '%${searchTerm}%' 
-                OR source LIKE '%${searchTerm}%'` : '';
-            
-            let orderClause = sortColumn ? `ORDER BY ${sortColumn}` : '';
-            
-            // Get total count
-            const totalResult = db.exec(`
-                SELECT COUNT(*) as count 
-                FROM breaches ${whereClause}`
-            )[0].values[0][0];
-            
-            // Get paginated and sorted data
-            const result = db.exec(`
-                SELECT record_count, dump_name, breach_date, info, source 
-                FROM breaches 
-                ${whereClause}
-                ${orderClause}
-                LIMIT ${pageSize} 
-                OFFSET ${(page - 1) * pageSize}`
-            )[0];
-            
-            const formattedData = result.values.map(row => {
-                return [
-                    new Intl.NumberFormat().format(row[0]),
-                    row[1],
-                    row[2],
-                    row[3],
-                    row[4]
-                ];
-            });
-            
-            callback({
-                draw: data.draw,
-                recordsTotal: totalResult,
-                recordsFiltered: totalResult,
-                data: formattedData
-            });
-        },
+        // Searches go to the query service when one is configured, the in-browser database otherwise
+        ajax: QUERY_ENDPOINT ? {url: QUERY_ENDPOINT, dataSrc: json => json.data.map(formatRow)} : localQuery,
         columns: [
             { 
                 data: 0,
                 type: 'num',  // Ensures proper numeric sorting
                 render: function(data) {
-                    return data;  // Already formatted in formattedData
+                    return data;  // Already formatted by formatRow
                 }
             },
             { data: 1 },
@@ -0,0 +1,250 @@
+import argparse, json, logging, os, sqlite3, threading, socketserver, bisect
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from urllib.request import pathname2url
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+import search
+
+
+"""
+Optional search service over breaches-search.sqlite (see sqlite_export.py) speaking the DataTables server-side protocol, so the search page can
+query it (see QUERY_ENDPOINT in main.js) instead of downloading the whole database. GET or POST /search with the
+parameters DataTables sends (draw, start, length, search[value], order[i][column], order[i][dir]) returns
+{"draw", "recordsTotal", "recordsFiltered", "data"}.
+
+Pages are fetched with keyset pagination: the sort key of the last row of every page served is kept per
+(term, order), so the next page seeks straight past it instead of counting through LIMIT/OFFSET. Pages and counts
+are kept in LRU caches, all of which are dropped when the database is replaced. Without breaches-search.sqlite the
+service falls back to breaches.sqlite, where every search is a LIKE scan.
+
+Run it with `python query_service.py`, or under any WSGI server as `query_service:create_app()`.
+"""
+
+DEFAULT_DATABASE = "datasets/breaches-search.sqlite"
+FALLBACK_DATABASE = "datasets/breaches.sqlite"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_LENGTH = 25
+MAX_LENGTH = 1000
+# most cursors remembered for a single (term, order), older pages fall back to an offset from the nearest cursor
+MAX_CURSORS = 1000
+
+class LRUCache:
+    """
+    Thread safe mapping holding at most size items, evicting the least recently used.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+class Cursors:
+    """
+    Sort keys of the rows ending the pages served for one (term, order), by the position of the row following them.
+    """
+    def __init__(self):
+        self.positions = []
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def nearest(self, position):
+        """
+        Returns (position, key) of the closest cursor at or before position, (0, None) when there is none.
+        """
+        with self.lock:
+            i = bisect.bisect_right(self.positions, position)
+            if not i:
+                return 0, None
+            return self.positions[i - 1], self.keys[self.positions[i - 1]]
+
+    def add(self, position, key):
+        with self.lock:
+            if position in self.keys or len(self.positions) >= MAX_CURSORS:
+                return
+            bisect.insort(self.positions, position)
+            self.keys[position] = key
+
+class BreachStore:
+    """
+    Cached, read-only access to the breaches database from any number of threads, each with its own connection. The
+    database is reopened and the caches cleared when the file is replaced.
+    """
+    def __init__(self, path=DEFAULT_DATABASE, cache_size=DEFAULT_CACHE_SIZE):
+        self.path = os.path.abspath(path)
+        self.pages = LRUCache(cache_size)
+        self.counts = LRUCache(cache_size)
+        self.cursors = LRUCache(cache_size)
+        self.version = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def connection(self):
+        stat = os.stat(self.path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    if self.version is not None:
+                        logging.info("%s changed, clearing the caches", self.path)
+                    self.pages.clear()
+                    self.counts.clear()
+                    self.cursors.clear()
+                    self.version = version
+        if getattr(self.local, "version", None) != version:
+            if getattr(self.local, "conn", None) is not None:
+                self.local.conn.close()
+            self.local.conn = sqlite3.connect("file:{}?mode=ro".format(pathname2url(self.path)), uri=True, check_same_thread=False)
+            self.local.fts = search.has_fts(self.local.conn)
+            self.local.version = version
+        return self.local.conn
+
+    def count(self, term):
+        conn = self.connection()
+        count = self.counts.get(term)
+        if count is None:
+            count = search.count(conn, term, self.local.fts)
+            self.counts.set(term, count)
+        return count
+
+    def page(self, term, order, start, length):
+        conn = self.connection()
+        rows = self.pages.get((term, order, start, length))
+        if rows is not None:
+            return rows
+        cursors = self.cursors.get((term, order))
+        if cursors is None:
+            cursors = Cursors()
+            self.cursors.set((term, order), cursors)
+        position, after = cursors.nearest(start)
+        rows, key = search.search_page(conn, term, order, length, after=after, offset=start - position, fts=self.local.fts)
+        if key is not None:
+            cursors.add(start + len(rows), key)
+        self.pages.set((term, order, start, length), rows)
+        return rows
+
+def parse_order(params):
+    """
+    Returns the (column index, direction) pairs of a DataTables request, dropping unknown columns and directions
+    so equivalent requests share their cache entries.
+    """
+    order = []
+    i = 0
+    while "order[{}][column]".format(i) in params:
+        column = int(params["order[{}][column]".format(i)][0])
+        direction = params.get("order[{}][dir]".format(i), ["asc"])[0].upper()
+        if 0 <= column < len(search.COLUMNS) and direction in ("ASC", "DESC"):
+            order.append((column, direction))
+        i += 1
+    return tuple(order)
+
+def parse_request(params):
+    length = int(params.get("length", [DEFAULT_LENGTH])[0])
+    if length < 0 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+    return {
+        "draw": int(params.get("draw", [0])[0]),
+        "start": max(0, int(params.get("start", [0])[0])),
+        "length": length,
+        "term": params.get("search[value]", [""])[0],
+        "order": parse_order(params),
+    }
+
+def create_app(path=DEFAULT_DATABASE, cache_size=DEFAULT_CACHE_SIZE, allow_origin="*"):
+    """
+    Returns the WSGI application answering DataTables searches from the database at path.
+    """
+    if path == DEFAULT_DATABASE and not os.path.exists(path):
+        logging.warning("%s not found, searching %s without a full-text index", path, FALLBACK_DATABASE)
+        path = FALLBACK_DATABASE
+    store = BreachStore(path, cache_size)
+
+    def respond(start_response, status, body):
+        data = json.dumps(body, separators=(',', ':')).encode()
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(data)))]
+        if allow_origin:
+            headers.append(("Access-Control-Allow-Origin", allow_origin))
+        start_response(status, headers)
+        return [data]
+
+    def application(environ, start_response):
+        if environ.get("PATH_INFO") != "/search":
+            return respond(start_response, "404 Not Found", {"error": "not found"})
+        method = environ.get("REQUEST_METHOD")
+        if method == "OPTIONS":
+            headers = [("Access-Control-Allow-Methods", "GET, POST"), ("Access-Control-Allow-Headers", "Content-Type")]
+            if allow_origin:
+                headers.append(("Access-Control-Allow-Origin", allow_origin))
+            start_response("204 No Content", headers)
+            return []
+        query = environ.get("QUERY_STRING", "")
+        if method == "POST":
+            size = int(environ.get("CONTENT_LENGTH") or 0)
+            query = environ["wsgi.input"].read(size).decode("utf-8", "replace")
+        elif method != "GET":
+            return respond(start_response, "405 Method Not Allowed", {"error": "method not allowed"})
+        try:
+            request = parse_request(parse_qs(query))
+        except ValueError as e:
+            return respond(start_response, "400 Bad Request", {"error": str(e)})
+        try:
+            rows = store.page(request["term"], request["order"], request["start"], request["length"])
+            body = {
+                "draw": request["draw"],
+                "recordsTotal": store.count(""),
+                "recordsFiltered": store.count(request["term"]),
+                "data": [list(row) for row in rows],
+            }
+        except (OSError, sqlite3.Error) as e:
+            logging.error("Error searching %s: %s", path, str(e))
+            return respond(start_response, "503 Service Unavailable", {"error": "database unavailable"})
+        return respond(start_response, "200 OK", body)
+
+    return application
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serves DataTables searches over the breaches database.")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="database to search (default: %(default)s)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="pages and counts kept in memory (default: %(default)s)")
+    parser.add_argument("--allow-origin", default="*", help="Access-Control-Allow-Origin sent with every response, empty to send none (default: %(default)s)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'
+    )
+    server = make_server(args.host, args.port, create_app(args.database, args.cache_size, args.allow_origin), server_class=ThreadingWSGIServer, handler_class=RequestHandler)
+    logging.info("Serving %s on http://%s:%d/search", args.database, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,164 @@
+import argparse, hashlib, json, os, threading, logging
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+"""
+Record/replay transports for the scrapers. A RecordingAdapter mounted on a session performs the real requests and
+saves every response to a fixtures directory, a ReplayAdapter serves them back without touching the network, so the
+scrapers (including the FlareSolverr calls, which go through the same sessions) can be benchmarked and
+regression-tested offline.
+
+Every distinct request (method, URL and body) is stored as <key>.json, listing the responses it got in order, with
+the bodies in <key>.<n>.body, and environment.json holds the environment variables that are part of the recorded
+URLs (FlareSolverr's address). Replaying a request returns its responses in the recorded order and then keeps
+returning the last one. Only response headers are recorded, so API keys sent as request headers never reach the
+fixtures.
+
+    $ python replay.py record [--fixtures benchmarks/fixtures/http] [provider ...]  # from the repository root
+"""
+
+DEFAULT_FIXTURES = "benchmarks/fixtures/http"
+ENVIRONMENT_FILE = "environment.json"
+# environment variables that end up in request URLs, saved with the fixtures so replayed requests match
+RECORDED_ENVIRONMENT = ["FLARESOLVERR_URL"]
+# the recorded bodies are already decoded, so these would describe the original transfer rather than the fixture
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+def request_key(request):
+    """
+    Returns the fixture key of a prepared request, a hash of its method, URL and body.
+    """
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha256()
+    digest.update("{} {}\n".format(request.method, request.url).encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()[:32]
+
+def mount(session, adapter):
+    """
+    Routes every HTTP(S) request of a session through adapter.
+    """
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def load_environment(directory=DEFAULT_FIXTURES):
+    """
+    Returns the environment variables saved with the fixtures in directory.
+    """
+    try:
+        with open(os.path.join(directory, ENVIRONMENT_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Transport adapter performing real requests and saving their responses to directory.
+    """
+    def __init__(self, directory=DEFAULT_FIXTURES, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        key = request_key(request)
+        body = response.content
+        with self.lock:
+            path = os.path.join(self.directory, key + ".json")
+            try:
+                with open(path, "r") as f:
+                    fixture = json.load(f)
+            except (OSError, ValueError):
+                fixture = {"method": request.method, "url": request.url, "responses": []}
+            body_file = "{}.{}.body".format(key, len(fixture["responses"]))
+            with open(os.path.join(self.directory, body_file), "wb") as f:
+                f.write(body)
+            fixture["responses"].append({
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS},
+                "body": body_file,
+            })
+            with open(path, "w") as f:
+                json.dump(fixture, f, indent=1)
+        logging.debug("Recorded %s %s (%d bytes) as %s", request.method, request.url, len(body), key)
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter answering requests from the fixtures in directory. A request that wasn't recorded raises
+    requests.exceptions.ConnectionError, like an unreachable host would.
+    """
+    def __init__(self, directory=DEFAULT_FIXTURES):
+        super().__init__()
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.fixtures = {}
+        self.served = {}
+
+    def fixture(self, key):
+        if key not in self.fixtures:
+            try:
+                with open(os.path.join(self.directory, key + ".json"), "r") as f:
+                    self.fixtures[key] = json.load(f)
+            except OSError:
+                self.fixtures[key] = None
+        return self.fixtures[key]
+
+    def send(self, request, **kwargs):
+        key = request_key(request)
+        with self.lock:
+            fixture = self.fixture(key)
+            if not fixture:
+                raise requests.exceptions.ConnectionError("No recorded response for {} {}".format(request.method, request.url), request=request)
+            index = min(self.served.get(key, 0), len(fixture["responses"]) - 1)
+            self.served[key] = index + 1
+        recorded = fixture["responses"][index]
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded.get("reason")
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        with open(os.path.join(self.directory, recorded["body"]), "rb") as f:
+            response._content = f.read()
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Records the responses of the live providers as replay fixtures.")
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("providers", nargs="*", help="names of the providers to record (default: every enabled provider)")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="directory the fixtures are saved to (default: %(default)s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'
+    )
+    import scraper, clearance, tempfile
+    os.makedirs(args.fixtures, exist_ok=True)
+    with open(os.path.join(args.fixtures, ENVIRONMENT_FILE), "w") as f:
+        json.dump({name: os.environ[name] for name in RECORDED_ENVIRONMENT if name in os.environ}, f, indent=1)
+    # record what the providers actually send rather than revalidations of cached copies, and solve every
+    # clearance from scratch so the FlareSolverr calls are recorded too
+    scraper.HTTP_CACHE.enabled = False
+    scraper.TRANSPORT = RecordingAdapter(args.fixtures)
+    scraper.CLEARANCE = clearance.ClearancePool(scraper.CLEARANCE.solve, os.path.join(tempfile.mkdtemp(), "clearance.json"))
+    for provider in scraper.enabled_providers():
+        if args.providers and provider["name"] not in args.providers:
+            continue
+        logging.info("Recording %s", provider["label"])
+        result = provider["scrape"](scraper.generate_requests_session())
+        logging.info("Recorded %s: %d breaches", provider["label"], len(result or []))
@@ -0,0 +1,82 @@
+import json, os, random, time, logging
+
+
+"""
+Refresh schedule of the providers for the scraper's daemon mode (scraper.py --daemon). Every provider is refreshed on
+its own interval ("interval" in the registry, DEFAULT_INTERVAL otherwise), spread by a random jitter so providers
+sharing an interval don't all fire at once. A provider that fails is retried after a backoff doubling with every
+consecutive failure, up to its interval. The schedule is persisted so a restarted daemon doesn't refresh providers
+that are still fresh.
+"""
+
+DEFAULT_PATH = ".cache/schedule.json"
+DEFAULT_INTERVAL = 24 * 60 * 60 # seconds
+JITTER = 0.1 # fraction of the interval a refresh may be moved earlier or later
+FAILURE_BACKOFF = 15 * 60 # seconds, doubled after every consecutive failure
+
+class Schedule:
+    """
+    Next refresh time, consecutive failures and last success of every provider, by provider name.
+    """
+    def __init__(self, providers, path=DEFAULT_PATH, jitter=JITTER):
+        self.providers = {provider["name"]: provider for provider in providers}
+        self.path = path
+        self.jitter = jitter
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        # providers missing from the saved schedule are due right away
+        self.entries = {name: state.get(name, {"next": 0, "failures": 0, "last_success": None}) for name in self.providers}
+
+    def interval(self, provider):
+        return provider.get("interval", DEFAULT_INTERVAL)
+
+    def due(self, now=None):
+        """
+        Returns the providers due for a refresh, in registry order.
+        """
+        now = time.time() if now is None else now
+        return [provider for name, provider in self.providers.items() if self.entries[name]["next"] <= now]
+
+    def next_run(self):
+        """
+        Returns the time the next provider is due, None when there are no providers.
+        """
+        if not self.entries:
+            return None
+        return min(entry["next"] for entry in self.entries.values())
+
+    def record(self, provider, succeeded, now=None):
+        """
+        Schedules a provider's next refresh after it succeeded or failed.
+        """
+        now = time.time() if now is None else now
+        entry = self.entries[provider["name"]]
+        interval = self.interval(provider)
+        if succeeded:
+            entry["failures"] = 0
+            entry["last_success"] = now
+            delay = interval * (1 + random.uniform(-self.jitter, self.jitter))
+        else:
+            entry["failures"] += 1
+            delay = min(FAILURE_BACKOFF * 2 ** (entry["failures"] - 1), interval)
+            logging.warning("%s failed %d times in a row, retrying in %d seconds", provider["name"], entry["failures"], delay)
+        entry["next"] = now + delay
+
+    def postpone(self, provider, delay, now=None):
+        """
+        Moves a provider's next refresh delay seconds later, e.g. while its previous refresh is still running.
+        """
+        now = time.time() if now is None else now
+        self.entries[provider["name"]]["next"] = now + delay
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -1,5 +1,6 @@
-import requests, json, csv, os, traceback, logging, time
-from bs4 import BeautifulSoup
+import requests, json, os, traceback, logging, time, argparse, threading, contextlib, signal, collections
+import concurrent.futures
+import http_cache, archive_cache, sink, scheduler, domain_index, history, clearance, table_parser, combine, sqlite_export, delta, stats, entities, columnar, shards, replay, telemetry, transport
 
 
 """
@@ -22,7 +23,7 @@ def clean_json(breaches):
     """
     Cleans an array of json objects by stripping any key/value pairs where the key is not in the whitelist.
     """
-    whitelist = ["dump_name","breach_date","record_count","info","index_date","description","source"]
+    whitelist = combine.WHITELIST
     clean_breaches = []
     for breach in breaches:
         clean_breach = {}
@@ -38,25 +39,75 @@ def remove_non_digits(string):
     """
     return ''.join(filter(lambda x: x.isdigit(), string))
 
+# Shared on-disk cache of provider responses, disabled with --no-cache
+HTTP_CACHE = http_cache.ResponseCache()
+# Cleaned archived datasets keyed by content hash, disabled with --no-cache
+ARCHIVE_CACHE = archive_cache.ArchiveCache()
+# Transport adapter mounted on every new session when set, e.g. a replay.RecordingAdapter or replay.ReplayAdapter
+TRANSPORT = None
+# Telemetry of the current run, saved with --report/--metrics
+TELEMETRY = telemetry.RunReport()
+# Also builds breaches-search.sqlite, the full-text indexed copy of breaches.sqlite, when set with --search-index
+SEARCH_INDEX = False
+
 def generate_requests_session():
     """
-    Generates a requests session.
+    Generates a requests session on the shared transport (pooled connections, timeouts and retries), GET requests
+    are revalidated against HTTP_CACHE.
     """
-    session = requests.Session()
+    session = http_cache.CachedSession(HTTP_CACHE)
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
     })
+    if TRANSPORT is not None:
+        replay.mount(session, TRANSPORT)
+    else:
+        transport.mount(session)
     return session
 
-def get_via_flaresolverr(url, cookies_only=False):
+def parse_phase(session):
+    """
+    Times a block as the parse phase of the provider the session was instrumented for.
+    """
+    provider = getattr(session, "provider", None)
+    if provider is None:
+        return contextlib.nullcontext()
+    return TELEMETRY.phase(provider, "parse")
+
+def parse_response(session, response, parse):
+    """
+    Parses a response with parse(response), reusing the stored result when the body was served from the HTTP cache.
+    """
+    cache = getattr(session, "cache", None)
+    key = getattr(response, "cache_key", None)
+    if cache is None or key is None or not cache.enabled:
+        with parse_phase(session):
+            return parse(response)
+    if response.from_cache:
+        result = cache.get_parsed(key, parse.__name__)
+        if result is not None:
+            logging.debug("Reusing cached parse result for %s", key)
+            return result
+    with parse_phase(session):
+        result = parse(response)
+    if result is not None:
+        cache.set_parsed(key, parse.__name__, result)
+    return result
+
+FLARESOLVERR_MAX_TIMEOUT = 60000 # milliseconds FlareSolverr may spend on a challenge
+
+def get_via_flaresolverr(url, cookies_only=False, session=None):
     # This function uses a specified FlareSolverr instance to get around Cloudflare captchas/bot detection
     flaresolverr_url = os.getenv('FLARESOLVERR_URL')
-    resp = requests.post(flaresolverr_url, json={
+    if session is None:
+        session = generate_requests_session()
+    # FlareSolverr only answers once the challenge is solved, so the read timeout covers its maxTimeout
+    resp = session.post(flaresolverr_url, json={
         'cmd': 'request.get',
         'url': url,
-        'maxTimeout': 60000, # 60s
+        'maxTimeout': FLARESOLVERR_MAX_TIMEOUT,
         'returnOnlyCookies': cookies_only
-    })
+    }, timeout=(transport.CONNECT_TIMEOUT, FLARESOLVERR_MAX_TIMEOUT / 1000 + transport.READ_TIMEOUT))
     if resp.status_code == 200:
         resp_json = resp.json()
         if 'status' in resp_json:
@@ -66,455 +117,717 @@ def get_via_flaresolverr(url, cookies_only=False):
                 return resp_json['solution']['response']
     return None
 
-def scrape_leaklookup(session=generate_requests_session()):
+def solve_clearance(url):
+    """
+    Solves a Cloudflare clearance for url through FlareSolverr, recording the solve in TELEMETRY.
+    """
+    start = time.monotonic()
+    solution = get_via_flaresolverr(url, cookies_only=True)
+    TELEMETRY.record_solve(url, time.monotonic() - start, solution is not None)
+    return solution
+
+# Clearance cookies for the Cloudflare protected providers, solved through FlareSolverr only when needed
+CLEARANCE = clearance.ClearancePool(solve_clearance)
+
+def scrape_leaklookup(session=None):
     """
     Scrapes the Leak-Lookup dataset.
     """
-    breaches = []
+    if session is None:
+        session = generate_requests_session()
     url = "https://leak-lookup.com/breaches"
     response = session.get(url)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data_table = soup.find('table', {'id': 'datatables-indexed-breaches'})
-        for entry in data_table.find('tbody').find_all('tr'):
-            """
-            Example <tr>
-            <tr>
-                <td>astropid.com</td>
-                <td class="d-xl-table-cell">5,789</td>
-                <td class="d-xl-table-cell">2017-02-20</td>
-                <td class="table-action text-center">
-                    <div class="dropdown position-relative">
-                        <a href="#" data-bs-toggle="dropdown" data-bs-display="static">
-                            <i class="align-middle" data-feather="more-horizontal"></i>
-                        </a>
-
-                        <div class="dropdown-menu dropdown-menu-end">
-                            <a id="astropid-com" class="dropdown-item" data-bs-toggle="modal" data-id="1" data-bs-target="#breachModal">Information</a>
-                        </div>
-                    </div>
-                </td>
-            </tr>
-            """
-            tds = entry.find_all('td')
-            dump_name = tds[0].text.strip()
-            record_count = remove_non_digits(tds[1].text.replace(",","").strip())
-            # YYYY-MM-DD
-            date = tds[2].text.strip()
-            breaches.append({"dump_name": dump_name, "record_count": record_count, "index_date": date, "source": "Leak-Lookup"})
-        return breaches
+        return parse_response(session, response, parse_leaklookup)
     else:
         return None
 
-def scrape_breachdirectory(session=generate_requests_session()):
+def parse_leaklookup(response):
     """
-    Scrapes the BreachDirectory dataset index.
+    Parses the Leak-Lookup breaches page.
     """
     breaches = []
+    for tds in table_parser.iter_table_rows(response.text, table_id='datatables-indexed-breaches'):
+        """
+        Example <tr>
+        <tr>
+            <td>astropid.com</td>
+            <td class="d-xl-table-cell">5,789</td>
+            <td class="d-xl-table-cell">2017-02-20</td>
+            <td class="table-action text-center">
+                <div class="dropdown position-relative">
+                    <a href="#" data-bs-toggle="dropdown" data-bs-display="static">
+                        <i class="align-middle" data-feather="more-horizontal"></i>
+                    </a>
+
+                    <div class="dropdown-menu dropdown-menu-end">
+                        <a id="astropid-com" class="dropdown-item" data-bs-toggle="modal" data-id="1" data-bs-target="#breachModal">Information</a>
+                    </div>
+                </div>
+            </td>
+        </tr>
+        """
+        dump_name = tds[0]
+        record_count = remove_non_digits(tds[1])
+        # YYYY-MM-DD
+        date = tds[2]
+        breaches.append({"dump_name": dump_name, "record_count": record_count, "index_date": date, "source": "Leak-Lookup"})
+    return breaches
+
+def scrape_breachdirectory(session=None):
+    """
+    Scrapes the BreachDirectory dataset index.
+    """
+    if session is None:
+        session = generate_requests_session()
     url = "https://breachdirectory.org/tables"
-    response = get_via_flaresolverr(url)
-    if response:
-        soup = BeautifulSoup(response, 'html.parser')
-        data_table = soup.find('table', {'class': 'chakra-table'})
-        for entry in data_table.find('tbody').find_all('tr'):
-            """
-            <tr class="css-1whkjwr">
-                <td class="css-osmp5g">collection-1</td>
-                <td class="css-osmp5g">2,147,483,647</td>
-                <td class="css-osmp5g">2019-01-24</td>
-            </tr>
-            """
-            tds = entry.find_all('td')
-            dump_name = tds[0].text.strip()
-            breach_date = tds[2].text.strip()
-            record_count = remove_non_digits(tds[1].text.strip())
-            breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "source": "BreachDirectory"})
-        return breaches
+    response = CLEARANCE.get(session, url)
+    if response is not None and response.status_code == 200 and 'chakra-table' in response.text:
+        with parse_phase(session):
+            return parse_breachdirectory(response.text)
+    # the table is rendered client side when it isn't part of the served page, fall back to a full browser render
+    logging.info("BreachDirectory table not found in the page, rendering it through FlareSolverr")
+    html = get_via_flaresolverr(url, session=session)
+    if html:
+        with parse_phase(session):
+            return parse_breachdirectory(html)
     else:
-        print(f"Received non-200 status code: {response.status_code}")
+        logging.error("Unable to fetch BreachDirectory tables")
         return None
 
-def scrape_leakcheck(session=generate_requests_session()):
+def parse_breachdirectory(html):
     """
-    Scrapes the LeakCheck dataset index.
+    Parses the BreachDirectory tables page.
     """
     breaches = []
+    for tds in table_parser.iter_table_rows(html, table_class='chakra-table'):
+        """
+        <tr class="css-1whkjwr">
+            <td class="css-osmp5g">collection-1</td>
+            <td class="css-osmp5g">2,147,483,647</td>
+            <td class="css-osmp5g">2019-01-24</td>
+        </tr>
+        """
+        dump_name = tds[0]
+        breach_date = tds[2]
+        record_count = remove_non_digits(tds[1])
+        breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "source": "BreachDirectory"})
+    return breaches
+
+def scrape_leakcheck(session=None):
+    """
+    Scrapes the LeakCheck dataset index.
+    """
+    if session is None:
+        session = generate_requests_session()
     url = "https://leakcheck.io/databases-list"
-    response = get_via_flaresolverr(url)
-    if response:
-        # load as json
-        soup = BeautifulSoup(response, 'html.parser')
-        json_data = soup.find('pre').text.strip()
-        data = json.loads(json_data)
-        for entry in data['data']:
-            """
-            {"id":1,"name":"MyHeritage.com","count":89769623,"breach_date":"2017-10","unverified":0,"passwordless":0,"compilation":0}
-            """
-            dump_name = entry['name']
-            breach_date = entry['breach_date']
-            record_count = entry['count']
-            breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "source": "LeakCheck.io"})
-        return breaches
+    response = CLEARANCE.get(session, url)
+    if response is not None and response.status_code == 200:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
     else:
-        print(f"Received non-200 status code: {response.status_code}")
-        return None
+        data = None
+    if data is None:
+        # fall back to a full browser render, where the JSON is wrapped in a <pre>
+        html = get_via_flaresolverr(url, session=session)
+        if not html:
+            logging.error("Unable to fetch the LeakCheck databases list")
+            return None
+        # imported here so importing the scraper doesn't pay for bs4
+        from bs4 import BeautifulSoup
+        with parse_phase(session):
+            soup = BeautifulSoup(html, 'html.parser')
+            data = json.loads(soup.find('pre').text.strip())
+    with parse_phase(session):
+        return parse_leakcheck(data)
 
-def scrape_scatteredsecrets(session=generate_requests_session()):
+def parse_leakcheck(data):
     """
-    Scrapes the ScatteredSecrets dataset.
+    Parses the LeakCheck databases list.
     """
     breaches = []
+    for entry in data['data']:
+        """
+        {"id":1,"name":"MyHeritage.com","count":89769623,"breach_date":"2017-10","unverified":0,"passwordless":0,"compilation":0}
+        """
+        dump_name = entry['name']
+        breach_date = entry['breach_date']
+        record_count = entry['count']
+        breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "source": "LeakCheck.io"})
+    return breaches
+
+def scrape_scatteredsecrets(session=None):
+    """
+    Scrapes the ScatteredSecrets dataset.
+    """
+    if session is None:
+        session = generate_requests_session()
     url = "https://scatteredsecrets.com/"
     response = session.get(url)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data_table = soup.find('table', {'id': 'dumps_table'})
-        for entry in data_table.find('tbody').find_all('tr'):
-            try:
-                """
-                <tr class="odd">
-                    <td class="sorting_1">0-o.ca</td>
-                </tr>
-                """
-                    # valid entry
-                dump_name = entry.find('td').text.strip()
-                breaches.append({"dump_name": dump_name, "source": "ScatteredSecrets"})
-            except Exception as e:
-                print(f"Error grabbing dump name: {entry}")
-        return breaches
+        return parse_response(session, response, parse_scatteredsecrets)
     else:
         return None
+
+def parse_scatteredsecrets(response):
+    """
+    Parses the ScatteredSecrets dumps table.
+    """
+    breaches = []
+    for tds in table_parser.iter_table_rows(response.text, table_id='dumps_table'):
+        """
+        <tr class="odd">
+            <td class="sorting_1">0-o.ca</td>
+        </tr>
+        """
+        breaches.append({"dump_name": tds[0], "source": "ScatteredSecrets"})
+    return breaches
     
-def scrape_hashmob_official(session=generate_requests_session()):
+def scrape_hashmob_official(session=None):
     # Scrapes the "official" hashlists from the hashmob.net website.
+    if session is None:
+        session = generate_requests_session()
     api_key = os.getenv('HASHMOB_API_KEY')
     url = "https://hashmob.net/api/v2/hashlist/official"
     response = session.get(url, headers={'api-key':api_key})
-    breaches = []
     if response.status_code == 200:
-        for entry in response.json():
-            breaches.append({'dump_name':entry['name'], 'info': entry['algorithm'], 'record_count': entry['total_hashes'], 'source':'Hashmob'})
-        return breaches
+        return parse_response(session, response, parse_hashmob_official)
     return None
 
-def scrape_hibp(session=generate_requests_session()):
+def parse_hashmob_official(response):
+    breaches = []
+    for entry in response.json():
+        breaches.append({'dump_name':entry['name'], 'info': entry['algorithm'], 'record_count': entry['total_hashes'], 'source':'Hashmob'})
+    return breaches
+
+def scrape_hibp(session=None):
     """
     Scrapes the HaveIBeenPwned dataset.
     """
-    breaches = []
+    if session is None:
+        session = generate_requests_session()
     url = "https://haveibeenpwned.com/api/v3/breaches"
     response = session.get(url)
     if response.status_code == 200:
-        data = response.json()
-        for entry in data:
-            breaches.append({"dump_name": entry['Name'], "record_count": entry['PwnCount'], "breach_date": entry['BreachDate'], "index_date": entry['AddedDate'], "description": entry['Description'], "info": entry['Description'], "source": "HaveIBeenPwned"})
-        return breaches
+        return parse_response(session, response, parse_hibp)
     else:
         return None
 
+def parse_hibp(response):
+    """
+    Parses the HaveIBeenPwned breaches API response.
+    """
+    breaches = []
+    data = response.json()
+    for entry in data:
+        breaches.append({"dump_name": entry['Name'], "record_count": entry['PwnCount'], "breach_date": entry['BreachDate'], "index_date": entry['AddedDate'], "description": entry['Description'], "info": entry['Description'], "source": "HaveIBeenPwned"})
+    return breaches
+
 
-def get_dehashed_page(session=generate_requests_session(), page=1, attempt=0):
-    MAX_ATTEMPTS = 3
-    url = f"https://web-api.dehashed.com/datawells?page={page}&sort=name-ASC&count=50"
-    response = session.get(url)
-    # print rate limit headers
-    if response.status_code == 200:
-        return response.json()
-    else:
-        # we are doing this single threaded, current rate limit is ~50 requests per 3 seconds - we should never hit this, but just in case.
-        if "X-Ratelimit-Remaining" in response.headers:
-            if response.headers["X-Ratelimit-Remaining"] == "0":
-                logging.error("Dehashed Rate limit exceeded")
-                # rate limit hit, lets wait until it resets
-                time.sleep(response.headers["X-Ratelimit-Reset"])
-                return get_dehashed_page(session, page)
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter. acquire() blocks until a request may be sent, update() keeps the bucket
+    in sync with the X-Ratelimit-Remaining/X-Ratelimit-Reset headers returned by the server.
+    """
+    def __init__(self, requests_per_period, period):
+        self.rate = requests_per_period / period
+        self.capacity = requests_per_period
+        self.tokens = float(requests_per_period)
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    delay = self.blocked_until - now
+            time.sleep(delay)
+
+    def update(self, headers):
+        try:
+            remaining = int(headers["X-Ratelimit-Remaining"])
+        except (KeyError, ValueError):
+            return
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0:
+                try:
+                    reset = float(headers.get("X-Ratelimit-Reset", 0))
+                except ValueError:
+                    reset = 0
+                # the reset header may either be a delay in seconds or a unix timestamp
+                if reset > 1e9:
+                    reset -= time.time()
+                self.blocked_until = max(self.blocked_until, time.monotonic() + max(reset, 1))
+
+# current rate limit is ~50 requests per 3 seconds
+DEHASHED_RATE_LIMIT = (50, 3)
+DEHASHED_WORKERS = 8
+DEHASHED_MAX_ATTEMPTS = 5
+DEHASHED_BACKOFF = 2 # seconds, doubled after every failed attempt
+DEHASHED_MAX_BACKOFF = 60
+DEHASHED_HOST = "web-api.dehashed.com"
+# one pooled connection per page in flight
+transport.HOST_POOL_SIZES[DEHASHED_HOST] = DEHASHED_WORKERS
+# get_dehashed_page() retries failed pages itself, adapter retries would multiply its attempts
+transport.HOST_RETRIES[DEHASHED_HOST] = 0
+
+def get_dehashed_page(session=None, page=1, limiter=None, max_attempts=DEHASHED_MAX_ATTEMPTS):
+    """
+    Fetches a single page of Dehashed datawells, retrying with exponential backoff. Returns None once max_attempts is exhausted.
+    """
+    if session is None:
+        session = generate_requests_session()
+    url = f"https://{DEHASHED_HOST}/datawells?page={page}&sort=name-ASC&count=50"
+    for attempt in range(max_attempts):
+        if limiter:
+            limiter.acquire()
+        try:
+            response = session.get(url)
+        except requests.RequestException as e:
+            logging.warning("Dehashed page %d request failed: %s", page, str(e))
+        else:
+            if limiter:
+                limiter.update(response.headers)
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError:
+                    # e.g. a Cloudflare interstitial served with a 200
+                    logging.warning("Dehashed page %d is not valid JSON", page)
+            elif response.headers.get("X-Ratelimit-Remaining") == "0" or response.status_code == 429:
+                # the limiter holds back every worker until the reset, so only wait here when running without one
+                logging.warning("Dehashed rate limit exceeded on page %d", page)
+                if not limiter:
+                    try:
+                        time.sleep(float(response.headers.get("X-Ratelimit-Reset", 0)))
+                    except ValueError:
+                        pass
             else:
-                if attempt > MAX_ATTEMPTS:
-                    logging.error("Dehashed Rate limit exceeded, max attempts reached")
-                    return None
-                # unknown error, lets wait 10 seconds and try again
-                time.sleep(10)
-                return get_dehashed_page(session, page)
-        logging.error(f"Received non-200 status code: {response.status_code}")
+                logging.warning("Received non-200 status code for Dehashed page %d: %d", page, response.status_code)
+        if attempt + 1 < max_attempts:
+            TELEMETRY.increment("Dehashed", "retries")
+            time.sleep(min(DEHASHED_BACKOFF * 2 ** attempt, DEHASHED_MAX_BACKOFF))
+    logging.error("Failed to fetch Dehashed page %d, max attempts reached", page)
     return None
 
-def scrape_dehashed(session=generate_requests_session()):
+def scrape_dehashed(session=None, workers=DEHASHED_WORKERS):
     """
-    Scrapes the Dehashed dataset index.
+    Scrapes the Dehashed dataset index, keeping up to `workers` pages in flight under a shared rate limiter.
     """
+    if session is None:
+        session = generate_requests_session()
+    limiter = TokenBucket(*DEHASHED_RATE_LIMIT)
+    pages = {}
+    # pages after `last_page` are not needed, either the index ended or an earlier page could not be fetched
+    last_page = None
+    next_page = 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dehashed") as executor:
+        in_flight = {}
+        for _ in range(workers):
+            in_flight[executor.submit(get_dehashed_page, session, next_page, limiter)] = next_page
+            next_page += 1
+        while in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                data = future.result()
+                if data is None:
+                    logging.error("No data returned from Dehashed for page %d", page)
+                    last_page = page - 1 if last_page is None else min(last_page, page - 1)
+                    continue
+                pages[page] = data['data_wells']
+                if data['next_page'] != True:
+                    last_page = page if last_page is None else min(last_page, page)
+                if last_page is None:
+                    in_flight[executor.submit(get_dehashed_page, session, next_page, limiter)] = next_page
+                    next_page += 1
     breaches = []
-    page = 1
-    while True:
-        data = get_dehashed_page(session, page)
-        if data:
-            for entry in data['data_wells']:
-                breaches.append({"dump_name": entry['name'], "breach_date": entry['date'], "record_count": entry['records'], "info": entry['description'], "source": "Dehashed"})
-            if data['next_page'] == True:
-                page += 1
-            else:
-                break
-        else:
-            logging.error("No data returned from Dehashed")
+    for page in range(1, (last_page if last_page is not None else next_page - 1) + 1):
+        if page not in pages:
             break
+        for entry in pages[page]:
+            breaches.append({"dump_name": entry['name'], "breach_date": entry['date'], "record_count": entry['records'], "info": entry['description'], "source": "Dehashed"})
     return breaches
 
-def scrape_leaked_domains(session=generate_requests_session()):
+def scrape_leaked_domains(session=None):
+    if session is None:
+        session = generate_requests_session()
     breaches = []
     url = "https://leaked.domains/Info/"
-    # get cf_clearance
-    cookies, userAgent = get_via_flaresolverr(url, cookies_only=True)
-    # update cookies
-    req_cookies = {}
-    for cookie in cookies:
-        req_cookies[cookie['name']] = cookie['value']
-    # Update user-agent to match FlareSolverr's
-    session.headers.update({"User-Agent":userAgent})
-    # send request with new cookies
-    response = session.get(url, cookies=req_cookies)
+    # send request with the domain's cf_clearance cookies and matching user-agent
+    response = CLEARANCE.get(session, url)
+    if response is None:
+        logging.error("Unable to get Cloudflare clearance for Leaked.Domains")
+        return None
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        data_table = soup.find('table', {'id': 'leak_summery'})
-        for entry in data_table.find('tbody').find_all('tr'):
-            #print(entry)
-            tds = entry.find_all('td')
-            entry_type = tds[1].text.strip()
-            if entry_type == "Leakdb":
-                dump_name = tds[0].text.strip()
-                breach_date = tds[5].text.strip()
-                record_count = remove_non_digits(tds[6].text.replace(",","").strip())
-                info = tds[4].text.strip()
-                breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "info": info, "source": "Leaked.Domains"})
+        with parse_phase(session):
+            for tds in table_parser.iter_table_rows(response.text, table_id='leak_summery'):
+                entry_type = tds[1]
+                if entry_type == "Leakdb":
+                    dump_name = tds[0]
+                    breach_date = tds[5]
+                    record_count = remove_non_digits(tds[6])
+                    info = tds[4]
+                    breaches.append({"dump_name": dump_name, "breach_date": breach_date, "record_count": record_count, "info": info, "source": "Leaked.Domains"})
         return breaches
     else:
         print(f"Received non-200 status code: {response.status_code}")
         return None
 
-def scrape_9ghz(session=generate_requests_session()):
+def scrape_9ghz(session=None):
     """
     Scrapes the 9ghz dataset.
     """
-    breaches = []
+    if session is None:
+        session = generate_requests_session()
     url = "https://9ghz.com/api/v1/breach_list"
     response = session.get(url)
     if response.status_code == 200:
-        data = response.json()
-        for entry in data['data']:
-            breaches.append({"dump_name": entry['title'], "breach_date": entry['breach_date'], "record_count": entry['record_count'], "info": entry['domain'], "source": "9Ghz.com"})
-        return breaches
+        return parse_response(session, response, parse_9ghz)
     else:
         return None
 
-if __name__ == "__main__":
-    # initialize logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-
-    # init breaches
+def parse_9ghz(response):
+    """
+    Parses the 9ghz breach list API response.
+    """
     breaches = []
-    if "FLARESOLVERR_URL" in os.environ:
-        # scrape datasets from BreachDirectory
-        logging.info("Scraping BreachDirectory.org")
-        try:
-            bd_result = scrape_breachdirectory()
-            if bd_result:
-                breaches += bd_result
-                logging.info("Saving results to file")
-                with open("datasets/BreachDirectory.json", "w") as f:
-                    json.dump(bd_result, f)
-                with open("datasets/BreachDirectory.csv", "w") as f:
-                    writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","source"])
-                    writer.writeheader()
-                    writer.writerows(bd_result)
-                logging.info("Successfully scraped %d breaches from BreachDirectory.org", len(bd_result))
-            else:
-                logging.error("Scraping BreachDirectory failed")
-        except Exception as e:
-            logging.error('Error occurred while scraping BreachDirectory: %s', str(e))
-            logging.error('Traceback: %s', traceback.format_exc())
+    data = response.json()
+    for entry in data['data']:
+        breaches.append({"dump_name": entry['title'], "breach_date": entry['breach_date'], "record_count": entry['record_count'], "info": entry['domain'], "source": "9Ghz.com"})
+    return breaches
 
-        # scrape datasets from Leakcheck
-        logging.info("Scraping LeakCheck.io")
-        try:
-            lc_result = scrape_leakcheck()
-            if lc_result:
-                breaches += lc_result
-                logging.info("Saving results to file")
-                with open("datasets/LeakCheck.io.json", "w") as f:
-                    json.dump(lc_result, f)
-                with open("datasets/LeakCheck.io.csv", "w") as f:
-                    writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","source"])
-                    writer.writeheader()
-                    writer.writerows(lc_result)
-                logging.info("Successfully scraped %d breaches from LeakCheck.io", len(lc_result))
-            else:
-                logging.error("Scraping Leakcheck failed")
-        except Exception as e:
-            logging.error('Error occurred while scraping LeakCheck: %s', str(e))
-            logging.error('Traceback: %s', traceback.format_exc())
+# Registry of live providers. Each entry describes how to scrape a provider and where its results are saved,
+# "requires" lists environment variables that must be set for the provider to run, "timeout" (seconds)
+# overrides the global per-provider timeout and "interval" (seconds) is how often the daemon mode refreshes it.
+PROVIDERS = [
+    {"name": "BreachDirectory", "label": "BreachDirectory.org", "scrape": scrape_breachdirectory, "output": "BreachDirectory", "requires": ["FLARESOLVERR_URL"]},
+    {"name": "LeakCheck", "label": "LeakCheck.io", "scrape": scrape_leakcheck, "output": "LeakCheck.io", "requires": ["FLARESOLVERR_URL"]},
+    {"name": "Leaked.Domains", "label": "Leaked.Domains", "scrape": scrape_leaked_domains, "output": "Leaked.Domains", "requires": ["FLARESOLVERR_URL"]},
+    {"name": "9ghz", "label": "9Ghz.com", "scrape": scrape_9ghz, "output": "9Ghz"},
+    {"name": "Dehashed", "label": "Dehashed.com", "scrape": scrape_dehashed, "output": "Dehashed", "timeout": 3600, "interval": 3 * 24 * 60 * 60},
+    {"name": "ScatteredSecrets", "label": "ScatteredSecrets", "scrape": scrape_scatteredsecrets, "output": "ScatteredSecrets"},
+    {"name": "Hashmob", "label": "Hashmob", "scrape": scrape_hashmob_official, "output": "Hashmob", "requires": ["HASHMOB_API_KEY"]},
+    {"name": "HaveIBeenPwned", "label": "HaveIBeenPwned.com", "scrape": scrape_hibp, "output": "HaveIBeenPwned", "interval": 6 * 60 * 60},
+    {"name": "Leak-Lookup", "label": "Leak-Lookup.com", "scrape": scrape_leaklookup, "output": "Leak-Lookup"},
+]
 
-        # scrape datasets from Leaked.Domains
-        logging.info("Scraping Leaked.Domains")
-        try:
-            ld_result = scrape_leaked_domains()
-            if ld_result:
-                breaches += ld_result
-                logging.info("Saving results to file")
-                with open("datasets/Leaked.Domains.json", "w") as f:
-                    json.dump(ld_result, f)
-                with open("datasets/Leaked.Domains.csv", "w") as f:
-                    writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","info","source"])
-                    writer.writeheader()
-                    writer.writerows(ld_result)
-                logging.info("Successfully scraped %d breaches from Leaked.Domains", len(ld_result))
-            else:
-                logging.error("Scraping Leaked.Domains failed")
-        except Exception as e:
-            logging.error("Error occurred while scraping Leaked.Domains: %s", str(e))
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 900 # 15 minutes
 
-    # scrape datasets from 9Ghz
-    logging.info("Scraping 9Ghz.com")
-    try:
-        nineghz_result = scrape_9ghz()
-        if nineghz_result:
-            breaches += nineghz_result
-            logging.info("Saving results to file")
-            with open("datasets/9Ghz.json", "w") as f:
-                json.dump(nineghz_result, f)
-            with open("datasets/9Ghz.csv", "w") as f:
-                writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","info","source"])
-                writer.writeheader()
-                writer.writerows(nineghz_result)
-            logging.info("Successfully scraped %d breaches from 9Ghz.com", len(nineghz_result))
-        else:
-            logging.error("Scraping 9ghz failed")
-    except Exception as e:
-        logging.error("Error occurred while scraping 9ghz: %s", str(e))
-        logging.error('Traceback: %s', traceback.format_exc())
+def enabled_providers(providers=PROVIDERS):
+    """
+    Returns the providers whose required environment variables are set.
+    """
+    return [provider for provider in providers if all(var in os.environ for var in provider.get("requires", []))]
 
-    # scrape datasets from dehashed
-    logging.info("Scraping Dehashed.com (this will take some time)")
-    try:
-        dehashed_result = scrape_dehashed()
-        if dehashed_result:
-            breaches += dehashed_result
-            logging.info("Saving results to file")
-            with open("datasets/Dehashed.json", "w") as f:
-                json.dump(dehashed_result, f)
-            with open("datasets/Dehashed.csv", "w") as f:
-                writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","info","source"])
-                writer.writeheader()
-                writer.writerows(dehashed_result)
-            logging.info("Successfully scraped %d breaches from Dehashed.com", len(dehashed_result))
-        else:
-            logging.error("Scraping dehashed failed")
-    except Exception as e:
-        logging.error("Error occurred while scraping dehashed: %s", str(e))
-    
-    # scrape datasets from ScatteredSecrets
-    logging.info("Scraping ScatteredSecrets.com")
+def run_provider(provider, session=None):
+    """
+    Runs a single provider's scraper with its own instrumented session (a new one unless given), any exception is
+    logged and treated as a failed scrape.
+    """
+    logging.info("Scraping %s", provider["label"])
+    if session is None:
+        session = TELEMETRY.instrument(generate_requests_session(), provider["name"])
     try:
-        ss_result = scrape_scatteredsecrets()
-        if ss_result:
-            breaches += ss_result
-            logging.info("Saving results to file")
-            with open("datasets/ScatteredSecrets.json", "w") as f:
-                json.dump(ss_result, f)
-            with open("datasets/ScatteredSecrets.csv", "w") as f:
-                writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","source"])
-                writer.writeheader()
-                writer.writerows(ss_result)
-            logging.info("Successfully scraped %d breaches from ScatteredSecrets", len(ss_result))
-        else:
-            logging.error("Scraping ScatteredSecrets failed")
+        with TELEMETRY.phase(provider["name"], "scrape"):
+            return provider["scrape"](session)
     except Exception as e:
-        logging.error('Error occurred while scraping ScatteredSecrets: %s', str(e))
+        logging.error('Error occurred while scraping %s: %s', provider["name"], str(e))
         logging.error('Traceback: %s', traceback.format_exc())
+        return None
 
-    # scrape datasets from Hashmob
-    if "HASHMOB_API_KEY" in os.environ:
-        logging.info("Scraping Hashmob.net")
-        try:
-            hm_result = scrape_hashmob_official()
-            if hm_result:
-                breaches += hm_result
-                logging.info("Saving results to file")
-                with open("datasets/Hashmob.json", "w") as f:
-                    json.dump(hm_result, f)
-                with open("datasets/Hashmob.csv", "w") as f:
-                    writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","source","info"])
-                    writer.writeheader()
-                    writer.writerows(hm_result)
-                logging.info("Successfully scraped %d breaches from Hashmob", len(hm_result))
-            else:
-                logging.error("Scraping Hashmob failed")
-        except Exception as e:
-            logging.error('Error occurred while scraping Hashmob: %s', str(e))
-            logging.error('Traceback: %s', traceback.format_exc())
+DELTA_LOG = delta.DEFAULT_DIRECTORY
+# providers are saved in parallel, their changes must not interleave in DELTA_LOG
+DELTA_LOCK = threading.Lock()
+# Append-only history of every provider run, see history.py
+HISTORY = history.History()
 
-    # scrape datasets from HaveIBeenPwned
-    logging.info("Scraping HaveIBeenPwned.com")
-    try:
-        hibp_result = scrape_hibp()
-        if hibp_result:
-            breaches += hibp_result
-            logging.info("Saving results to file")    
-            with open("datasets/HaveIBeenPwned.json", "w") as f:
-                json.dump(hibp_result, f)
-            with open("datasets/HaveIBeenPwned.csv", "w") as f:
-                writer = csv.DictWriter(f, fieldnames=["dump_name","breach_date","record_count","info","index_date","description","source"])
-                writer.writeheader()
-                writer.writerows(hibp_result)
-            logging.info("Successfully scraped %d breaches from HaveIBeenPwned.com", len(hibp_result))
-        else:
-            logging.error("Scraping of HaveIBeenPwned failed")
-    except Exception as e:
-        logging.error('Error occurred while scraping HaveIBeenPwned: %s', str(e))
-        logging.error('Traceback: %s', traceback.format_exc())
-    
-    # scrape datasets from LeakLookup
-    logging.info("Scraping Leak-Lookup.com")
+def save_provider_result(provider, result, incremental=False, ndjson=False):
+    """
+    Saves a provider's results to datasets/<output>.json and datasets/<output>.csv, and datasets/<output>.ndjson with
+    ndjson. In incremental mode the results are first compared with the previous snapshot, the changes are appended
+    to DELTA_LOG and nothing is written if there are none. Returns True if the files were written.
+    """
+    if incremental:
+        changes = delta.diff_records(delta.load_snapshot("datasets/{}.json".format(provider["output"])), result)
+        if not delta.has_changes(changes):
+            logging.info("No changes in %s, keeping the existing files", provider["name"])
+            return False
+        with DELTA_LOCK:
+            delta.append_delta(DELTA_LOG, provider["output"], changes)
+        logging.info("%s changed: %d added, %d removed, %d changed", provider["name"], len(changes["added"]), len(changes["removed"]), len(changes["changed"]))
+    logging.info("Saving %s results to file", provider["name"])
+    sizes = sink.write_dataset("datasets/{}".format(provider["output"]), result, ndjson)
+    TELEMETRY.increment(provider["name"], "bytes_out", sum(sizes.values()))
+    return True
+
+def write_provider_result(provider, result, incremental=False, ndjson=False):
+    """
+    Saves a provider's results and records the run in HISTORY, recording the outcome in TELEMETRY. Returns True if
+    the files were written, any exception is logged and treated as nothing written.
+    """
     try:
-        ll_result = scrape_leaklookup()
-        breaches += ll_result
-        if ll_result:
-            logging.info("Saving results to file")
-            with open("datasets/Leak-Lookup.json", "w") as f:
-                json.dump(ll_result, f)
-            with open("datasets/Leak-Lookup.csv", "w") as f:
-                writer = csv.DictWriter(f, fieldnames=["dump_name","record_count","index_date","source"])
-                writer.writeheader()
-                writer.writerows(ll_result)
-            logging.info("Successfully scraped %d breaches from Leak-Lookup.com", len(ll_result))
-        else:
-            logging.error("Scraping of leak-lookup failed")
+        with TELEMETRY.phase(provider["name"], "write"):
+            saved = save_provider_result(provider, result, incremental, ndjson)
+            try:
+                HISTORY.record(provider["output"], result)
+            except Exception as e:
+                logging.error('Error occurred while recording the history of %s: %s', provider["name"], str(e))
+        TELEMETRY.set(provider["name"], "status", "ok" if saved else "unchanged")
+        logging.info("Successfully scraped %d breaches from %s", len(result), provider["label"])
+        return saved
     except Exception as e:
-        logging.error('Error occurred while scraping Leak-Lookup: %s', str(e))
+        TELEMETRY.set(provider["name"], "status", "write_failed")
+        logging.error('Error occurred while saving %s: %s', provider["name"], str(e))
         logging.error('Traceback: %s', traceback.format_exc())
+        return False
+
+def start_daemon_workers(fn, items, max_workers, name):
+    """
+    Runs fn(item) for every item in up to max_workers daemon threads, returns a dict of future -> item. Unlike the
+    threads of a ThreadPoolExecutor, which the interpreter joins when it exits, daemon threads can be abandoned: a
+    hung item doesn't keep the process alive. Futures not started yet can be cancelled.
+    """
+    futures = {concurrent.futures.Future(): item for item in items}
+    queue = collections.deque(futures.items())
 
-    # load static datasets
-    # loop through each JSON file in the datasets/ directory
-    ignore_files = ["combined.json","HaveIBeenPwned.json","Dehashed.json","Leak-Lookup.json","BreachDirectory.json","Hashmob.json","LeakCheck.io.json","ScatteredSecrets.json","Leaked.Domains.json"]
-    for file in os.listdir("datasets/"):
-        if file.endswith(".json") and file not in ignore_files:
-            logging.info("Loading %s", file)
+    def worker():
+        while True:
             try:
-                with open("datasets/{}".format(file), "r") as f:
-                    json_data = json.loads(f.read())
-                    for entry in json_data:
-                        entry["source"] = file.replace(".json","")
-                    breaches += json_data
-                    logging.info("Extracted %d breaches from %s", len(json_data), file)
-            except Exception as e:
-                logging.error('Error occurred while loading %s: %s', file, str(e))
-                logging.error('Traceback: %s', traceback.format_exc())
+                future, item = queue.popleft()
+            except IndexError:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(item))
+            except BaseException as e:
+                future.set_exception(e)
+
+    for i in range(min(max_workers, len(futures))):
+        threading.Thread(target=worker, name="{}_{}".format(name, i), daemon=True).start()
+    return futures
+
+def run_providers(providers, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, incremental=False, ndjson=False, sessions=None, abandoned=None):
+    """
+    Runs providers concurrently in a thread pool and returns a dict of provider name -> results (None on failure)
+    and the set of provider names whose files were written. Results are saved in a second pool as each provider
+    finishes, so the outputs of providers finishing together are written in parallel. A provider that runs longer
+    than its timeout is abandoned: its thread can't be interrupted, but it is a daemon thread that doesn't hold up
+    the process exit, and whatever it eventually returns is discarded.
+    With a sessions dict, each provider's session is kept in it by provider name and reused by later calls, except
+    the sessions of abandoned providers, which their threads may still be using. With an abandoned dict, the futures
+    of the abandoned providers are added to it by provider name.
+    """
+    results = {}
+    changed = set()
+    started = {}
+    writes = {}
+
+    def task(provider):
+        started[provider["name"]] = time.monotonic()
+        if sessions is None:
+            return run_provider(provider)
+        if provider["name"] not in sessions:
+            sessions[provider["name"]] = TELEMETRY.instrument(generate_requests_session(), provider["name"])
+        return run_provider(provider, sessions[provider["name"]])
+
+    writer = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="writer")
+    futures = start_daemon_workers(task, providers, max_workers, "provider")
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                provider = futures[future]
+                result = future.result()
+                if result:
+                    TELEMETRY.set(provider["name"], "rows", len(result))
+                    writes[writer.submit(write_provider_result, provider, result, incremental, ndjson)] = provider
+                else:
+                    TELEMETRY.set(provider["name"], "status", "failed")
+                    logging.error("Scraping %s failed", provider["name"])
+                results[provider["name"]] = result
+            now = time.monotonic()
+            for future in list(pending):
+                provider = futures[future]
+                limit = provider.get("timeout", timeout)
+                if provider["name"] in started and limit and now - started[provider["name"]] > limit:
+                    logging.error("Scraping %s timed out after %d seconds", provider["name"], limit)
+                    TELEMETRY.set(provider["name"], "status", "timeout")
+                    results[provider["name"]] = None
+                    pending.discard(future)
+                    if sessions is not None:
+                        # requests sessions aren't thread safe, the next run gets a new one
+                        sessions.pop(provider["name"], None)
+                    if abandoned is not None:
+                        abandoned[provider["name"]] = future
+        for future in concurrent.futures.as_completed(writes):
+            if future.result():
+                changed.add(writes[future]["name"])
+    finally:
+        # providers that haven't started are never run, the ones still running are left behind
+        for future in pending:
+            future.cancel()
+        # files being written are always finished, never left behind as temporary files
+        writer.shutdown(wait=True)
+    return results, changed
+
+def combined_sources(providers, results, directory="datasets/"):
+    """
+    Yields a (dataset, breaches) pair for every live provider that returned results, in registry order so
+    combined.json is stable regardless of which provider finished first, followed by the static datasets.
+    """
+    for provider in providers:
+        if results.get(provider["name"]):
+            yield provider["output"], results[provider["name"]]
+    ignore_files = combine.GENERATED_FILES + ["{}.json".format(provider["output"]) for provider in PROVIDERS]
+    yield from combine.iter_static_datasets(directory, ignore_files, ARCHIVE_CACHE)
+
+def combine_consumers(directory="datasets/"):
+    """
+    Returns the consumers building the artifacts derived from the combined breaches into directory.
+    """
+    return [
+        sqlite_export.SqliteBuilder(os.path.join(directory, "breaches.sqlite"), os.path.join(directory, "breaches-search.sqlite") if SEARCH_INDEX else None),
+        stats.StatsCollector(os.path.join(directory, "stats.json"), live=[provider["output"] for provider in PROVIDERS]),
+        entities.EntityResolver(os.path.join(directory, "entities.json")),
+        columnar.ColumnarWriter(os.path.join(directory, "combined.col")),
+        shards.ShardWriter(os.path.join(directory, "shards")),
+        domain_index.DomainIndexWriter(os.path.join(directory, "domains.idx")),
+    ]
 
-    # save combined results 
-    breaches = clean_json(breaches)
+def update_combined(providers, results, changed, incremental=False):
+    """
+    Rebuilds combined.json and the artifacts derived from it. In incremental mode the providers without results
+    contribute their previous snapshot, and nothing is rebuilt when no provider changed and the artifacts exist.
+    Returns True if the combined datasets were rebuilt.
+    """
+    if incremental:
+        # a failed provider keeps its previous snapshot in the combined datasets
+        for provider in providers:
+            if not results.get(provider["name"]):
+                results[provider["name"]] = delta.load_snapshot("datasets/{}.json".format(provider["output"]))
 
+    generated = ["datasets/{}".format(file) for file in combine.GENERATED_FILES] + [os.path.join(shards.DEFAULT_DIRECTORY, shards.MANIFEST)]
+    if incremental and not changed and all(os.path.exists(path) for path in generated):
+        logging.info("No provider changed, keeping the existing combined datasets")
+        return False
+    # save combined results
     logging.info("Saving combined results to file")
-    with open("datasets/combined.json", "w") as f:
-        f.write(json.dumps(breaches, separators=(',', ':')))
+    with TELEMETRY.phase(None, "combine"):
+        summary = combine.write_combined(combined_sources(providers, results), "datasets/combined.json", combine_consumers())
+    TELEMETRY.set(None, "combined_rows", summary["rows"])
+    TELEMETRY.set(None, "combined_bytes", summary["bytes"])
+    return True
+
+def save_telemetry(args):
+    TELEMETRY.finish()
+    TELEMETRY.log_summary()
+    if args.report:
+        TELEMETRY.write_json(args.report)
+    if args.metrics:
+        TELEMETRY.write_prometheus(args.metrics)
+
+# Set to stop the daemon once the providers being refreshed are done
+STOP = threading.Event()
+
+def run_daemon(args, providers):
+    """
+    Refreshes every provider on its own schedule (see scheduler.py) until STOP is set, keeping each provider's
+    session and the clearance cookies warm between refreshes. Refreshes are always incremental, the combined
+    datasets are only rebuilt when a refreshed provider changed. The telemetry, accumulated since the daemon
+    started, is saved after every round. A provider abandoned on timeout isn't refreshed again until its thread
+    is done.
+    """
+    schedule = scheduler.Schedule(providers)
+    sessions = {}
+    # provider name -> future of the abandoned runs that may still be running
+    abandoned = {}
+    while not STOP.is_set():
+        for name in [name for name, future in abandoned.items() if future.done()]:
+            del abandoned[name]
+        due = []
+        for provider in schedule.due():
+            if provider["name"] in abandoned:
+                logging.warning("%s is still running its abandoned refresh, postponing it", provider["name"])
+                schedule.postpone(provider, scheduler.FAILURE_BACKOFF)
+            else:
+                due.append(provider)
+        if due:
+            logging.info("Refreshing %s", ", ".join(provider["name"] for provider in due))
+            with TELEMETRY.phase(None, "scrape"):
+                results, changed = run_providers(due, max_workers=args.workers, timeout=args.timeout, incremental=True, ndjson=args.ndjson, sessions=sessions, abandoned=abandoned)
+            for provider in due:
+                schedule.record(provider, bool(results.get(provider["name"])))
+            schedule.save()
+            update_combined(providers, results, changed, incremental=True)
+            save_telemetry(args)
+        next_run = schedule.next_run()
+        if next_run is None:
+            logging.error("No providers enabled, nothing to refresh")
+            break
+        delay = max(0, next_run - time.time())
+        logging.info("Next refresh in %d seconds", delay)
+        STOP.wait(delay)
+    logging.info("Daemon stopped")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrapes breach indexes from the live providers and regenerates the combined dataset.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="maximum number of providers scraped at the same time (default: %(default)s)")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="seconds before a provider is abandoned, unless the provider sets its own (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="don't use or update the on-disk HTTP and archived dataset caches")
+    parser.add_argument("--ndjson", action="store_true", help="also save every provider's breaches as datasets/<provider>.ndjson, one per line")
+    parser.add_argument("--incremental", action="store_true", help="only rewrite datasets that changed, recording the changes in {}/".format(DELTA_LOG))
+    parser.add_argument("--search-index", action="store_true", help="also build datasets/breaches-search.sqlite, the full-text indexed copy of breaches.sqlite used by search.py and query_service.py")
+    parser.add_argument("--daemon", action="store_true", help="keep running, refreshing every provider on its own interval (implies --incremental)")
+    parser.add_argument("--connect-timeout", type=float, default=transport.CONNECT_TIMEOUT, help="seconds to wait for a connection to a provider (default: %(default)s)")
+    parser.add_argument("--read-timeout", type=float, default=transport.READ_TIMEOUT, help="seconds to wait for a provider to send data (default: %(default)s)")
+    parser.add_argument("--retries", type=int, default=transport.RETRIES, help="retries of failed connections and 500/502/504 responses (default: %(default)s)")
+    parser.add_argument("--report", help="file the run's telemetry is saved to as JSON")
+    parser.add_argument("--metrics", help="file the run's telemetry is saved to in the Prometheus text format, e.g. for node_exporter's textfile collector")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.no_cache:
+        HTTP_CACHE.enabled = False
+        ARCHIVE_CACHE.enabled = False
+    SEARCH_INDEX = args.search_index
+    # set before the first session creates the shared adapters
+    transport.CONNECT_TIMEOUT = args.connect_timeout
+    transport.READ_TIMEOUT = args.read_timeout
+    transport.RETRIES = args.retries
+
+    # initialize logging
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'
+    )
 
+    providers = enabled_providers()
+    if args.daemon:
+        # finish the refreshes in progress on SIGTERM/SIGINT rather than leaving half written datasets
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: STOP.set())
+        run_daemon(args, providers)
+    else:
+        # scrape the live providers
+        with TELEMETRY.phase(None, "scrape"):
+            results, changed = run_providers(providers, max_workers=args.workers, timeout=args.timeout, incremental=args.incremental, ndjson=args.ndjson)
+        update_combined(providers, results, changed, args.incremental)
+        save_telemetry(args)
     logging.info("Done :)")
@@ -0,0 +1,126 @@
+"""
+Search queries over breaches-search.sqlite (see sqlite_export.py), the same queries the web client runs in the
+browser. Terms of three characters or more are answered by the breaches_fts trigram index, shorter ones (which
+trigrams can't match) fall back to LIKE, as does every search of a database without the index such as
+breaches.sqlite. All user input is passed as bound parameters.
+"""
+
+COLUMNS = ["record_count", "dump_name", "breach_date", "info", "source"]
+# the trigram tokenizer needs at least three characters to match anything
+MIN_FTS_LENGTH = 3
+
+def fts_query(term):
+    """
+    Quotes a search term as an FTS5 string so it is matched as a substring rather than parsed as a query.
+    """
+    return '"{}"'.format(term.replace('"', '""'))
+
+def has_fts(conn):
+    try:
+        conn.execute("SELECT 1 FROM breaches_fts LIMIT 1")
+        return True
+    except Exception:
+        return False
+
+def where_clause(term, fts=True):
+    """
+    Returns the (sql, params) filtering breaches on a search term, the sql is empty when there is no term.
+    """
+    if not term:
+        return "", []
+    if fts and len(term) >= MIN_FTS_LENGTH:
+        return "WHERE breaches.id IN (SELECT rowid FROM breaches_fts WHERE breaches_fts MATCH ?)", [fts_query(term)]
+    pattern = "%{}%".format(term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+    return "WHERE dump_name LIKE ? ESCAPE '\\' OR info LIKE ? ESCAPE '\\' OR source LIKE ? ESCAPE '\\'", [pattern] * 3
+
+def order_clause(order, fts=False):
+    """
+    Returns the ORDER BY sorting a search by sort_keys(order, fts).
+    """
+    return "ORDER BY " + ", ".join("{} {}".format(expression, direction) for expression, direction in sort_keys(order, fts))
+
+def count(conn, term=None, fts=True):
+    """
+    Counts the breaches matching a term, using only the full-text index when it can answer the query.
+    """
+    if term and fts and len(term) >= MIN_FTS_LENGTH:
+        return conn.execute("SELECT COUNT(*) FROM breaches_fts WHERE breaches_fts MATCH ?", [fts_query(term)]).fetchone()[0]
+    where, params = where_clause(term, fts)
+    return conn.execute("SELECT COUNT(*) FROM breaches {}".format(where), params).fetchone()[0]
+
+def search(conn, term=None, order=((0, "DESC"),), start=0, length=25, fts=True):
+    """
+    Returns a page of (record_count, dump_name, breach_date, info, source) rows matching a term, sorted like
+    search_page() so both page through the same order.
+    """
+    if term and fts and len(term) >= MIN_FTS_LENGTH:
+        sql = "SELECT {} FROM breaches_fts JOIN breaches ON breaches.id = breaches_fts.rowid WHERE breaches_fts MATCH ? {} LIMIT ? OFFSET ?".format(
+            ", ".join("breaches." + column for column in COLUMNS), order_clause(order, True))
+        params = [fts_query(term)]
+    else:
+        where, params = where_clause(term, fts)
+        sql = "SELECT {} FROM breaches {} {} LIMIT ? OFFSET ?".format(", ".join(COLUMNS), where, order_clause(order))
+    return conn.execute(sql, params + [length, start]).fetchall()
+
+def sort_keys(order, fts=False):
+    """
+    Returns the (expression, direction) pairs a search is sorted by, the known columns of order followed by the
+    relevance when matching against the full-text index and the id, which makes every sort key unique.
+    """
+    keys = []
+    for column, direction in order:
+        if 0 <= column < len(COLUMNS) and direction.upper() in ("ASC", "DESC"):
+            keys.append(("breaches." + COLUMNS[column], direction.upper()))
+    if fts:
+        keys.append(("breaches_fts.rank", "ASC"))
+    keys.append(("breaches.id", "ASC"))
+    return keys
+
+def keyset_clause(keys, values):
+    """
+    Returns the (sql, params) selecting the rows sorted after the row whose sort key is values. The leading
+    inclusive bound on the first key lets SQLite seek its index instead of scanning from the start.
+    """
+    alternatives = []
+    params = [values[0]]
+    for i, (expression, direction) in enumerate(keys):
+        terms = ["{} = ?".format(previous) for previous, _ in keys[:i]]
+        terms.append("{} {} ?".format(expression, ">" if direction == "ASC" else "<"))
+        alternatives.append("(" + " AND ".join(terms) + ")")
+        params.extend(values[:i + 1])
+    first, direction = keys[0]
+    return "{} {}= ? AND ({})".format(first, ">" if direction == "ASC" else "<", " OR ".join(alternatives)), params
+
+def search_page(conn, term=None, order=((0, "DESC"),), length=25, after=None, offset=0, fts=True):
+    """
+    Keyset paginated search(). Returns (rows, key): the page of up to length rows sorted after the sort key after
+    (from the first row when None), skipping offset rows, and the sort key of its last row to continue from.
+    """
+    use_fts = bool(term) and fts and len(term) >= MIN_FTS_LENGTH
+    keys = sort_keys(order, use_fts)
+    conditions = []
+    params = []
+    if use_fts:
+        source = "breaches_fts JOIN breaches ON breaches.id = breaches_fts.rowid"
+        conditions.append("breaches_fts MATCH ?")
+        params.append(fts_query(term))
+    else:
+        source = "breaches"
+        where, where_params = where_clause(term, fts)
+        if where:
+            conditions.append("({})".format(where[len("WHERE "):]))
+            params.extend(where_params)
+    if after is not None:
+        keyset, keyset_params = keyset_clause(keys, after)
+        conditions.append(keyset)
+        params.extend(keyset_params)
+    sql = "SELECT {}, {} FROM {} {} {} LIMIT ? OFFSET ?".format(
+        ", ".join("breaches." + column for column in COLUMNS),
+        ", ".join(expression for expression, _ in keys),
+        source,
+        "WHERE " + " AND ".join(conditions) if conditions else "",
+        order_clause(order, use_fts))
+    rows = conn.execute(sql, params + [length, offset]).fetchall()
+    if not rows:
+        return [], None
+    return [row[:len(COLUMNS)] for row in rows], tuple(rows[-1][len(COLUMNS):])
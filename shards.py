@@ -0,0 +1,132 @@
+import json, gzip, hashlib, os, re, time, logging
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import combine
+
+
+"""
+Per dataset shards of the combined breaches for lazy loading by the web client. Every dataset is written to its
+own compact JSON array next to gzip (and, when the brotli module is installed, brotli) precompressed copies, so a
+static host can serve them without compressing on the fly. manifest.json lists the shards with their row counts,
+sizes and the SHA-256 of the uncompressed JSON, which the client uses to cache shards across visits.
+"""
+
+DEFAULT_DIRECTORY = "datasets/shards"
+MANIFEST = "manifest.json"
+UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]+")
+
+def shard_file(dataset):
+    return UNSAFE_CHARACTERS.sub("_", dataset) + ".json"
+
+class Shard:
+    """
+    A single shard being written, the plain and compressed files are written to temporary paths and only moved
+    into place by ShardWriter.close().
+    """
+    def __init__(self, directory, dataset):
+        self.dataset = dataset
+        self.file = shard_file(dataset)
+        self.path = os.path.join(directory, self.file)
+        self.rows = 0
+        self.bytes = 0
+        self.sha256 = hashlib.sha256()
+        self.plain = open(self.path + ".tmp", "wb")
+        # mtime=0 keeps the compressed output identical when the data doesn't change
+        self.gzip_file = open(self.path + ".gz.tmp", "wb")
+        self.gzip = gzip.GzipFile(filename="", mode="wb", fileobj=self.gzip_file, mtime=0)
+        self.brotli_file = None
+        if brotli:
+            self.brotli_file = open(self.path + ".br.tmp", "wb")
+            self.brotli = brotli.Compressor()
+
+    def write(self, data):
+        data = data.encode("utf-8")
+        self.plain.write(data)
+        self.gzip.write(data)
+        if self.brotli_file:
+            self.brotli_file.write(self.brotli.process(data))
+        self.sha256.update(data)
+        self.bytes += len(data)
+
+    def add(self, breach):
+        self.write(("[" if not self.rows else ",") + combine.ENCODER.encode(breach))
+        self.rows += 1
+
+    def close(self):
+        """
+        Finishes the files, moves them into place and returns the shard's manifest entry.
+        """
+        if not self.rows:
+            self.write("[")
+        self.write("]")
+        self.plain.close()
+        self.gzip.close()
+        self.gzip_file.close()
+        entry = {"dataset": self.dataset, "file": self.file, "rows": self.rows, "bytes": self.bytes, "sha256": self.sha256.hexdigest(), "encodings": {}}
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.path + ".gz.tmp", self.path + ".gz")
+        entry["encodings"]["gzip"] = {"file": self.file + ".gz", "bytes": os.path.getsize(self.path + ".gz")}
+        if self.brotli_file:
+            self.brotli_file.write(self.brotli.finish())
+            self.brotli_file.close()
+            os.replace(self.path + ".br.tmp", self.path + ".br")
+            entry["encodings"]["br"] = {"file": self.file + ".br", "bytes": os.path.getsize(self.path + ".br")}
+        return entry
+
+    def abort(self):
+        """
+        Closes and removes the temporary files, the previous shard is left in place.
+        """
+        for f in (self.plain, self.gzip, self.gzip_file, self.brotli_file):
+            if f is not None:
+                f.close()
+        for suffix in (".tmp", ".gz.tmp", ".br.tmp"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+class ShardWriter:
+    """
+    combine.write_combined() consumer writing one shard per dataset to directory, the manifest is written once
+    every shard is complete and shards of datasets that no longer exist are removed.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.shards = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, dataset, breach):
+        shard = self.shards.get(dataset)
+        if shard is None:
+            shard = self.shards[dataset] = Shard(self.directory, dataset)
+        shard.add(breach)
+
+    def close(self):
+        entries = [shard.close() for shard in self.shards.values()]
+        manifest = {
+            "generated": int(time.time()),
+            "rows": sum(entry["rows"] for entry in entries),
+            "bytes": sum(entry["bytes"] for entry in entries),
+            "shards": entries,
+        }
+        tmp_path = os.path.join(self.directory, MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST))
+        current = {MANIFEST}
+        for entry in entries:
+            current.add(entry["file"])
+            current.update(encoding["file"] for encoding in entry["encodings"].values())
+        for file in os.listdir(self.directory):
+            if file not in current and file.endswith((".json", ".json.gz", ".json.br")):
+                logging.info("Removing stale shard %s", file)
+                os.remove(os.path.join(self.directory, file))
+        logging.info("Written %d breaches to %d shards in %s", manifest["rows"], len(entries), self.directory)
+
+    def abort(self):
+        """
+        Discards the shards being written, the previous shards and manifest are left in place.
+        """
+        for shard in self.shards.values():
+            shard.abort()
@@ -0,0 +1,71 @@
+import csv, json, os, threading, logging
+import combine
+
+
+"""
+Output sink of the providers' datasets. A dataset's records are serialized once, in a single pass, to <base>.json,
+<base>.csv and optionally <base>.ndjson (one record per line). The CSV columns are derived from the schema
+(combine.WHITELIST, in that order) rather than listed per provider: every schema field present in the records gets a
+column. Every file is written to a temporary file next to it, and only once all of them were written completely are
+they renamed over the previous ones, in a final pass. Each rename is atomic, so a crash never leaves a truncated file
+behind, but the files aren't replaced together: a crash in between the renames leaves e.g. the new <base>.json next
+to the previous <base>.csv until the dataset is written again. Writes of different datasets don't share any state
+and can run in parallel threads.
+"""
+
+SCHEMA = combine.WHITELIST
+# same output as json.dump() of the whole list, so the JSON snapshots compare equal to the previous ones
+JSON_ENCODER = json.JSONEncoder()
+NDJSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def columns(records):
+    """
+    Returns the schema fields present in records, in schema order.
+    """
+    present = set()
+    for record in records:
+        present.update(record)
+    return [field for field in SCHEMA if field in present]
+
+def write_dataset(base, records, ndjson=False):
+    """
+    Writes records to <base>.json, <base>.csv and, with ndjson, <base>.ndjson. Returns the bytes written per path.
+    """
+    if not isinstance(records, list):
+        records = list(records)
+    paths = [base + ".json", base + ".csv"] + ([base + ".ndjson"] if ndjson else [])
+    directory = os.path.dirname(base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_paths = {path: "{}.{}.tmp".format(path, threading.get_ident()) for path in paths}
+    files = {}
+    try:
+        for path in paths:
+            files[path] = open(tmp_paths[path], "w", newline="" if path.endswith(".csv") else None)
+        json_file = files[base + ".json"]
+        ndjson_file = files.get(base + ".ndjson")
+        writer = csv.DictWriter(files[base + ".csv"], fieldnames=columns(records), extrasaction="ignore")
+        writer.writeheader()
+        json_file.write("[")
+        for i, record in enumerate(records):
+            if i:
+                json_file.write(", ")
+            json_file.write(JSON_ENCODER.encode(record))
+            writer.writerow(record)
+            if ndjson_file is not None:
+                ndjson_file.write(NDJSON_ENCODER.encode(record) + "\n")
+        json_file.write("]")
+        for path in paths:
+            files.pop(path).close()
+        sizes = {path: os.path.getsize(tmp_paths[path]) for path in paths}
+        for path in paths:
+            os.replace(tmp_paths[path], path)
+    except BaseException:
+        for f in files.values():
+            f.close()
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    logging.debug("Written %d records to %s", len(records), ", ".join(paths))
+    return sizes
@@ -0,0 +1,161 @@
+import argparse, os, re, shutil, sqlite3, logging
+
+
+"""
+Builds breaches.sqlite, a ready to open SQLite database of the combined dataset for the web client. The schema and
+the default values match the ones main.js used when it built the database itself, so the client can open the file
+with new SQL.Database(bytes) and query it straight away.
+
+The FTS5 trigram index used by search.py and query_service.py triples the size of the database and the stock sql.js
+build can't use it, so it goes into a separate server-side copy, breaches-search.sqlite, which is only built on
+request:
+
+    $ python sqlite_export.py [--database datasets/breaches.sqlite] [--output datasets/breaches-search.sqlite]
+"""
+
+DEFAULT_PATH = "datasets/breaches.sqlite"
+DEFAULT_SEARCH_PATH = "datasets/breaches-search.sqlite"
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS breaches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_count INTEGER,
+    dump_name TEXT,
+    breach_date TEXT,
+    info TEXT,
+    source TEXT
+)"""
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS breaches_record_count ON breaches (record_count)",
+    "CREATE INDEX IF NOT EXISTS breaches_breach_date ON breaches (breach_date)",
+    "CREATE INDEX IF NOT EXISTS breaches_source ON breaches (source)",
+]
+
+# Full-text index over the searchable columns. It is an external content table, so the text is only stored once in
+# breaches, and the trigram tokenizer lets MATCH answer the same substring searches LIKE '%term%' did.
+FTS_SCHEMA = """CREATE VIRTUAL TABLE IF NOT EXISTS breaches_fts USING fts5(
+    dump_name,
+    info,
+    source,
+    content='breaches',
+    content_rowid='id',
+    tokenize='trigram'
+)"""
+
+BATCH_SIZE = 10000
+
+LEADING_INT = re.compile(r"\s*([+-]?\d+)")
+
+def parse_int(value):
+    """
+    Mirrors JavaScript's parseInt(value) || 0, which main.js used for record_count.
+    """
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value == value and abs(value) != float("inf") else 0
+    if isinstance(value, str):
+        match = LEADING_INT.match(value)
+        if match:
+            return int(match.group(1))
+    return 0
+
+def to_row(breach):
+    """
+    Converts a cleaned breach to a (record_count, dump_name, breach_date, info, source) row.
+    """
+    return (
+        parse_int(breach.get("record_count")),
+        breach.get("dump_name") or "Unknown",
+        breach.get("breach_date") or "N/A",
+        breach.get("info") or "N/A",
+        breach.get("source") or "Unknown",
+    )
+
+def build_search_index(path=DEFAULT_PATH, search_path=DEFAULT_SEARCH_PATH):
+    """
+    Builds search_path, a copy of the database at path with the breaches_fts index. Returns False, leaving any
+    previous copy in place, when the SQLite library lacks FTS5 or the trigram tokenizer (SQLite 3.34+).
+    """
+    tmp_path = search_path + ".tmp"
+    shutil.copyfile(path, tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(FTS_SCHEMA)
+        conn.execute("INSERT INTO breaches_fts (breaches_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO breaches_fts (breaches_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        conn.close()
+        os.remove(tmp_path)
+        logging.warning("Not building %s, SQLite %s has no FTS5 trigram tokenizer: %s", search_path, sqlite3.sqlite_version, str(e))
+        return False
+    conn.close()
+    os.replace(tmp_path, search_path)
+    logging.info("Written the full-text index of %s to %s (%d bytes)", path, search_path, os.path.getsize(search_path))
+    return True
+
+class SqliteBuilder:
+    """
+    combine.write_combined() consumer writing every breach to a SQLite database. The database is built next to
+    path and only moved into place once it is complete. With a search_path, the copy with the full-text index is
+    built from it afterwards.
+    """
+    def __init__(self, path, search_path=None):
+        self.path = path
+        self.search_path = search_path
+        self.tmp_path = path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.conn = sqlite3.connect(self.tmp_path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute(SCHEMA)
+        self.rows = []
+        self.count = 0
+
+    def _flush(self):
+        self.conn.executemany("INSERT INTO breaches (record_count, dump_name, breach_date, info, source) VALUES (?, ?, ?, ?, ?)", self.rows)
+        self.count += len(self.rows)
+        self.rows = []
+
+    def add(self, dataset, breach):
+        self.rows.append(to_row(breach))
+        if len(self.rows) >= BATCH_SIZE:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        for index in INDEXES:
+            self.conn.execute(index)
+        self.conn.commit()
+        self.conn.execute("ANALYZE")
+        self.conn.execute("VACUUM")
+        self.conn.close()
+        os.replace(self.tmp_path, self.path)
+        logging.info("Written %d breaches to %s (%d bytes)", self.count, self.path, os.path.getsize(self.path))
+        if self.search_path:
+            build_search_index(self.path, self.search_path)
+
+    def abort(self):
+        """
+        Discards the partial database, the previous one is left in place.
+        """
+        self.conn.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the full-text search copy of breaches.sqlite for search.py and query_service.py.")
+    parser.add_argument("--database", default=DEFAULT_PATH, help="database built by scraper.py (default: %(default)s)")
+    parser.add_argument("--output", default=DEFAULT_SEARCH_PATH, help="search database (default: %(default)s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    build_search_index(args.database, args.output)
@@ -0,0 +1,97 @@
+import json, os, time, logging
+import dates
+
+
+"""
+Per dataset statistics (breach count, total records, min/max records and breach date range) computed in a single
+pass over the combined breaches and saved as a small manifest, so the README table and the web UI summary don't
+need to re-parse the datasets.
+"""
+
+def parse_record_count(value):
+    """
+    Returns a breach's record count as an int, or None when it isn't a whole number (e.g. missing or a float).
+    """
+    if type(value) == int:
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.replace(",",""))
+        except ValueError:
+            return None
+    return None
+
+def new_entry(live=False):
+    return {"live": live, "breaches": 0, "total_records": 0, "records_min": None, "records_max": None, "breach_date_min": None, "breach_date_max": None}
+
+def update_entry(entry, breach):
+    entry["breaches"] += 1
+    record_count = parse_record_count(breach.get("record_count"))
+    if record_count is not None:
+        entry["total_records"] += record_count
+        if entry["records_min"] is None or record_count < entry["records_min"]:
+            entry["records_min"] = record_count
+        if entry["records_max"] is None or record_count > entry["records_max"]:
+            entry["records_max"] = record_count
+    # formatted as YYYY[-MM[-DD]] dates compare chronologically as strings, unlike the mix of formats in the datasets
+    breach_date = dates.format_date(dates.normalize_date(breach.get("breach_date")))
+    if breach_date is not None:
+        if entry["breach_date_min"] is None or breach_date < entry["breach_date_min"]:
+            entry["breach_date_min"] = breach_date
+        if entry["breach_date_max"] is None or breach_date > entry["breach_date_max"]:
+            entry["breach_date_max"] = breach_date
+
+def breaches_stats(breaches, live=False):
+    """
+    Computes the statistics of a single dataset's breaches.
+    """
+    entry = new_entry(live)
+    for breach in breaches:
+        update_entry(entry, breach)
+    return entry
+
+def file_stats(path, live=False):
+    """
+    Computes the statistics of a single dataset file.
+    """
+    with open(path, "r") as f:
+        return breaches_stats(json.load(f), live)
+
+def load_manifest(path):
+    """
+    Loads a stats manifest, returns None if it doesn't exist or can't be read.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class StatsCollector:
+    """
+    combine.write_combined() consumer computing per dataset statistics, saved to path when closed. Datasets named
+    in live are flagged as automatically updated.
+    """
+    def __init__(self, path, live=()):
+        self.path = path
+        self.live = set(live)
+        self.datasets = {}
+
+    def add(self, dataset, breach):
+        entry = self.datasets.get(dataset)
+        if entry is None:
+            entry = self.datasets[dataset] = new_entry(dataset in self.live)
+        update_entry(entry, breach)
+
+    def close(self):
+        manifest = {
+            "generated": int(time.time()),
+            "breaches": sum(entry["breaches"] for entry in self.datasets.values()),
+            "total_records": sum(entry["total_records"] for entry in self.datasets.values()),
+            "datasets": self.datasets,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.path)
+        logging.info("Written statistics of %d datasets to %s", len(self.datasets), self.path)
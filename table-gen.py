@@ -1,53 +1,44 @@
 import os 
-import json
+import combine, stats, archive_cache
 
-ignore = ['combined.json']
+ignore = combine.GENERATED_FILES
 live = sorted(['HaveIBeenPwned.json','Dehashed.json','Hashmob.json','BreachDirectory.json','LeakCheck.io.json','ScatteredSecrets.json','Leak-Lookup.json','Leaked.Domains.json','9Ghz.json'], key=str.lower)
 
 TABLE_HEADER = """| Service Name | Breach Count | Total Records | Automatic Updates |
 | ------------ | ------------ | ------------- |        :--:       |\n"""
 
+# statistics computed by scraper.py while building the combined datasets
+manifest = stats.load_manifest('datasets/stats.json') or {"datasets": {}}
+# the archived datasets cached by scraper.py, loaded without parsing them again
+cache = archive_cache.ArchiveCache()
+
+def dataset_stats(file, is_live):
+    # datasets that weren't part of the last combine (e.g. a live provider that wasn't scraped) are read directly
+    name = file.replace('.json','')
+    if name in manifest['datasets']:
+        return manifest['datasets'][name]
+    print(f"Loading datasets/{file}")
+    if is_live:
+        return stats.file_stats(f'datasets/{file}', is_live)
+    return stats.breaches_stats(cache.load(f'datasets/{file}', name), is_live)
+
+def table_row(file, is_live):
+    entry = dataset_stats(file, is_live)
+    updates = '✅' if is_live else '❌'
+    if entry['total_records'] == 0:
+        return f"| {file.replace('.json','')} | {entry['breaches']:,} | Unavailable | {updates} |\n"
+    return f"| {file.replace('.json','')} | {entry['breaches']:,} | {entry['total_records']:,} | {updates} |\n"
+
 readme_table = TABLE_HEADER
 
 # do live datasets
 for file in live:
-    print(f"Loading datasets/{file}")
-    data = json.loads(open(f'datasets/{file}','r').read())
-    breach_count = len(data)
-    total_count = 0
-    for item in data:
-        try:
-            if "record_count" in item:
-                if type(item['record_count']) == int:
-                    total_count += item['record_count']
-                else:
-                    total_count += int(item['record_count'].replace(",",""))
-        except Exception as e:
-            continue
-    if total_count == 0:
-        readme_table += f"| {file.replace('.json','')} | {breach_count:,} | Unavailable | ✅ |\n"
-    else:
-        readme_table += f"| {file.replace('.json','')} | {breach_count:,} | {total_count:,} | ✅ |\n"
+    readme_table += table_row(file, True)
 
 # do archived datasets
 for file in sorted(os.listdir('datasets/'), key=str.lower):
     if file not in live and file not in ignore and file.endswith('.json'):
-        print(f"Loading datasets/{file}")
-        data = json.loads(open(f'datasets/{file}','r').read())
-        breach_count = len(data)
-        total_count = 0
-        for item in data:
-            try:
-                if type(item['record_count']) == int:
-                    total_count += item['record_count']
-                else:
-                    total_count += int(item['record_count'].replace(",",""))
-            except:
-                continue
-        if total_count == 0:
-            readme_table += f"| {file.replace('.json','')} | {breach_count:,} | Unavailable | ❌ |\n"
-        else:
-            readme_table += f"| {file.replace('.json','')} | {breach_count:,} | {total_count:,} | ❌ |\n"
+        readme_table += table_row(file, False)
 
 # update table in readme
 template = open('README.tpl').read()
@@ -0,0 +1,137 @@
+from html.parser import HTMLParser
+
+
+"""
+Streaming extraction of a single HTML table. Only the rows of the target table are kept, as tuples of their <td>
+texts, so no DOM is built for the rest of the page and the parser stops as soon as the table is closed.
+"""
+
+CHUNK_SIZE = 64 * 1024
+
+class _TableDone(Exception):
+    pass
+
+class TableRowParser(HTMLParser):
+    """
+    Calls on_row(cells) for every body row of the first table matching table_id and/or table_class. Rows without
+    any <td> (header rows) and rows in <thead>/<tfoot> are skipped, nested tables become part of the cell text.
+    """
+    def __init__(self, on_row, table_id=None, table_class=None):
+        super().__init__(convert_charrefs=True)
+        self.on_row = on_row
+        self.table_id = table_id
+        self.table_class = table_class
+        # depth of nested tables inside the target table, 0 while outside of it
+        self.depth = 0
+        self.done = False
+        self.section = None
+        self.row = None
+        self.cell = None
+
+    def _matches(self, attrs):
+        attrs = dict(attrs)
+        if self.table_id is not None and attrs.get("id") != self.table_id:
+            return False
+        if self.table_class is not None and self.table_class not in (attrs.get("class") or "").split():
+            return False
+        return True
+
+    def _end_cell(self):
+        if self.cell is not None:
+            self.row.append("".join(self.cell).strip())
+            self.cell = None
+
+    def _end_row(self):
+        self._end_cell()
+        if self.row and self.section not in ("thead", "tfoot"):
+            self.on_row(tuple(self.row))
+        self.row = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "table":
+            if self.depth:
+                self.depth += 1
+            elif self._matches(attrs):
+                self.depth = 1
+            return
+        if self.depth != 1:
+            return
+        if tag in ("thead", "tbody", "tfoot"):
+            if self.row is not None:
+                self._end_row()
+            self.section = tag
+        elif tag == "tr":
+            if self.row is not None:
+                self._end_row()
+            self.row = []
+        elif tag in ("td", "th"):
+            if self.row is None:
+                self.row = []
+            self._end_cell()
+            # header cells are dropped, like find_all('td') does
+            if tag == "td":
+                self.cell = []
+
+    def handle_endtag(self, tag):
+        if not self.depth:
+            return
+        if tag == "table":
+            self.depth -= 1
+            if not self.depth:
+                if self.row is not None:
+                    self._end_row()
+                self.done = True
+                raise _TableDone()
+        elif self.depth == 1:
+            if tag == "td":
+                self._end_cell()
+            elif tag == "tr" and self.row is not None:
+                self._end_row()
+            elif tag in ("thead", "tbody", "tfoot"):
+                if self.row is not None:
+                    self._end_row()
+                self.section = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+def _chunks(text):
+    for i in range(0, len(text), CHUNK_SIZE):
+        yield text[i:i + CHUNK_SIZE]
+
+def parse_table(source, on_row, table_id=None, table_class=None):
+    """
+    Feeds source (an HTML string or an iterable of string chunks) to a TableRowParser calling on_row for every row.
+    Returns True if the table was found.
+    """
+    parser = TableRowParser(on_row, table_id=table_id, table_class=table_class)
+    if isinstance(source, str):
+        source = _chunks(source)
+    try:
+        for chunk in source:
+            parser.feed(chunk)
+        parser.close()
+    except _TableDone:
+        pass
+    return parser.depth > 0 or parser.done
+
+def iter_table_rows(source, table_id=None, table_class=None):
+    """
+    Generator version of parse_table(), yields the rows as tuples while the source is being parsed.
+    """
+    rows = []
+    parser = TableRowParser(rows.append, table_id=table_id, table_class=table_class)
+    if isinstance(source, str):
+        source = _chunks(source)
+    try:
+        for chunk in source:
+            parser.feed(chunk)
+            yield from rows
+            rows.clear()
+        parser.close()
+    except _TableDone:
+        pass
+    yield from rows
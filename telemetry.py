@@ -0,0 +1,197 @@
+import contextlib, json, logging, os, sys, threading, time
+from urllib.parse import urlparse
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+"""
+Run telemetry for the scraper: per provider phase durations (scrape, fetch, parse, write), HTTP request counts by
+status code, bytes downloaded and written, retries and row counts, run level phases such as the combine, the
+duration of the FlareSolverr clearance solves and the peak RSS of the process. The report is saved as JSON and in
+the Prometheus text format, ready for node_exporter's textfile collector. Everything that accumulates over the
+lifetime of the report, e.g. across the rounds of the daemon mode, is exported as a counter.
+
+HTTP requests are attributed to a provider through a response hook on the provider's session (see instrument()),
+which also counts the retries urllib3 made before the response. "fetch" adds up the time of every request, including the body download, so it can exceed the wall time of a
+provider that keeps several requests in flight.
+"""
+
+METRIC_PREFIX = "known_breaches"
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the process in bytes, or None where it isn't available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage if sys.platform == "darwin" else usage * 1024
+
+def new_provider():
+    return {"status": None, "rows": 0, "requests": 0, "status_codes": {}, "bytes_in": 0, "bytes_out": 0, "retries": 0, "phases": {}}
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class RunReport:
+    """
+    Thread safe collector of a run's telemetry.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start = time.monotonic()
+        self.duration = None
+        self.providers = {}
+        self.phases = {}
+        self.solves = {}
+        self.values = {}
+
+    def _provider(self, provider):
+        entry = self.providers.get(provider)
+        if entry is None:
+            entry = self.providers[provider] = new_provider()
+        return entry
+
+    def add_phase(self, provider, name, seconds):
+        """
+        Adds seconds to a provider's phase, or to a run level phase when provider is None.
+        """
+        with self.lock:
+            phases = self.phases if provider is None else self._provider(provider)["phases"]
+            phases[name] = phases.get(name, 0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, provider, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(provider, name, time.monotonic() - start)
+
+    def increment(self, provider, key, amount=1):
+        with self.lock:
+            entry = self._provider(provider)
+            entry[key] += amount
+
+    def set(self, provider, key, value):
+        """
+        Sets a provider's value, or a run level value when provider is None.
+        """
+        with self.lock:
+            if provider is None:
+                self.values[key] = value
+            else:
+                self._provider(provider)[key] = value
+
+    def record_response(self, provider, response):
+        # reading the body here times its download, requests reads it right after the hooks anyway
+        start = time.monotonic()
+        size = len(response.content or b"")
+        download = time.monotonic() - start
+        with self.lock:
+            entry = self._provider(provider)
+            entry["requests"] += 1
+            status = str(response.status_code)
+            entry["status_codes"][status] = entry["status_codes"].get(status, 0) + 1
+            entry["bytes_in"] += size
+            # retries done by the transport's urllib3 Retry, the provider's own retries are counted by the provider
+            entry["retries"] += len(getattr(getattr(response.raw, "retries", None), "history", None) or ())
+            entry["phases"]["fetch"] = entry["phases"].get("fetch", 0) + response.elapsed.total_seconds() + download
+
+    def instrument(self, session, provider):
+        """
+        Attributes the requests of a session to provider. The session's provider attribute names the provider.
+        """
+        session.provider = provider
+        session.hooks["response"].append(lambda response, *args, **kwargs: self.record_response(provider, response))
+        return session
+
+    def record_solve(self, url, seconds, solved):
+        with self.lock:
+            entry = self.solves.setdefault(urlparse(url).hostname, {"solves": 0, "failures": 0, "seconds": 0})
+            entry["solves"] += 1
+            entry["seconds"] += seconds
+            if not solved:
+                entry["failures"] += 1
+
+    def finish(self):
+        with self.lock:
+            self.duration = time.monotonic() - self.start
+            self.values["peak_rss_bytes"] = peak_rss()
+
+    def to_dict(self):
+        with self.lock:
+            return json.loads(json.dumps({
+                "started": int(self.started),
+                "duration": self.duration if self.duration is not None else time.monotonic() - self.start,
+                "phases": self.phases,
+                "values": self.values,
+                "providers": self.providers,
+                "clearance_solves": self.solves,
+            }))
+
+    def prometheus(self):
+        """
+        Returns the report in the Prometheus text exposition format.
+        """
+        report = self.to_dict()
+        metrics = []
+
+        def metric(name, help, samples, kind="gauge"):
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            metrics.append("# HELP {}_{} {}".format(METRIC_PREFIX, name, help))
+            metrics.append("# TYPE {}_{} {}".format(METRIC_PREFIX, name, kind))
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, escape_label(label)) for key, label in labels.items())
+                metrics.append("{}_{}{} {}".format(METRIC_PREFIX, name, "{" + label_text + "}" if label_text else "", value))
+
+        providers = sorted(report["providers"].items())
+        metric("run_timestamp_seconds", "Unix time the run started.", [({}, report["started"])])
+        metric("run_duration_seconds", "Wall time of the run.", [({}, round(report["duration"], 3))])
+        metric("run_phase_seconds_total", "Wall time of the run level phases.", [({"phase": phase}, round(seconds, 3)) for phase, seconds in sorted(report["phases"].items())], "counter")
+        metric("peak_rss_bytes", "Peak resident set size of the scraper.", [({}, report["values"].get("peak_rss_bytes"))])
+        metric("combined_rows", "Breaches written to combined.json.", [({}, report["values"].get("combined_rows"))])
+        metric("combined_bytes", "Bytes written to combined.json.", [({}, report["values"].get("combined_bytes"))])
+        metric("provider_success", "1 if the provider was scraped successfully.", [({"provider": name}, 1 if entry["status"] in ("ok", "unchanged") else 0) for name, entry in providers if entry["status"]])
+        metric("provider_phase_seconds_total", "Time spent by a provider in each phase.", [({"provider": name, "phase": phase}, round(seconds, 3)) for name, entry in providers for phase, seconds in sorted(entry["phases"].items())], "counter")
+        metric("provider_rows", "Breaches scraped from a provider.", [({"provider": name}, entry["rows"]) for name, entry in providers])
+        metric("provider_http_requests_total", "HTTP requests sent for a provider by status code.", [({"provider": name, "status": status}, count) for name, entry in providers for status, count in sorted(entry["status_codes"].items())], "counter")
+        metric("provider_bytes_in_total", "Response bytes downloaded for a provider.", [({"provider": name}, entry["bytes_in"]) for name, entry in providers], "counter")
+        metric("provider_bytes_out_total", "Bytes written to a provider's dataset files.", [({"provider": name}, entry["bytes_out"]) for name, entry in providers], "counter")
+        metric("provider_retries_total", "Requests retried for a provider, by the transport or the provider itself.", [({"provider": name}, entry["retries"]) for name, entry in providers], "counter")
+        metric("clearance_solves_total", "FlareSolverr clearance solves by domain.", [({"domain": domain}, entry["solves"]) for domain, entry in sorted(report["clearance_solves"].items())], "counter")
+        metric("clearance_solve_failures_total", "Failed FlareSolverr clearance solves by domain.", [({"domain": domain}, entry["failures"]) for domain, entry in sorted(report["clearance_solves"].items())], "counter")
+        metric("clearance_solve_seconds_total", "Time spent solving clearances by domain.", [({"domain": domain}, round(entry["seconds"], 3)) for domain, entry in sorted(report["clearance_solves"].items())], "counter")
+        return "\n".join(metrics) + "\n"
+
+    def _write(self, path, data):
+        # written to a temporary file first, the textfile collector must never see a partial file
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def write_json(self, path):
+        self._write(path, json.dumps(self.to_dict(), indent=1) + "\n")
+
+    def write_prometheus(self, path):
+        self._write(path, self.prometheus())
+
+    def log_summary(self):
+        report = self.to_dict()
+        for name, entry in sorted(report["providers"].items(), key=lambda item: -item[1]["phases"].get("scrape", 0)):
+            logging.info("%s: %s, %d breaches in %.1fs (fetch %.1fs, parse %.1fs, write %.1fs), %d requests %s, %d retries, %d bytes in, %d bytes out",
+                name, entry["status"], entry["rows"], entry["phases"].get("scrape", 0), entry["phases"].get("fetch", 0), entry["phases"].get("parse", 0),
+                entry["phases"].get("write", 0), entry["requests"], entry["status_codes"], entry["retries"], entry["bytes_in"], entry["bytes_out"])
+        for domain, entry in sorted(report["clearance_solves"].items()):
+            logging.info("Clearance for %s: %d solves (%d failed) in %.1fs", domain, entry["solves"], entry["failures"], entry["seconds"])
+        logging.info("Run took %.1fs, peak RSS %s bytes", report["duration"], report["values"].get("peak_rss_bytes"))
@@ -0,0 +1,89 @@
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+"""
+Shared HTTP transport of the scrapers. Every session gets the same adapters, so connections are pooled and kept
+alive across sessions and providers. The adapters are only created when the first session needs them. Requests
+get default connect/read timeouts so a hung host can't stall a run, and connection errors and transient server
+errors are retried with exponential backoff.
+
+Hosts listed in HOST_POOL_SIZES get their own adapter with a pool of that size, e.g. a provider fetching several
+pages at once, and hosts listed in HOST_RETRIES their own adapter with that many retries, e.g. 0 for a provider
+retrying requests itself. The settings are read when the adapters are first created, so change them before the
+first request.
+"""
+
+CONNECT_TIMEOUT = 10 # seconds
+READ_TIMEOUT = 60 # seconds
+POOL_SIZE = 10
+# host -> connection pool size, for hosts that get more concurrent requests than POOL_SIZE
+HOST_POOL_SIZES = {}
+RETRIES = 3
+# host -> retries, for hosts whose callers retry on their own
+HOST_RETRIES = {}
+BACKOFF_FACTOR = 1 # seconds, doubled after every retry
+# 503 and 403 are left to the callers, they are how Cloudflare challenges a request
+RETRY_STATUSES = (500, 502, 504)
+
+_adapters = {}
+_lock = threading.Lock()
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter applying a default (connect, read) timeout to the requests that don't set one.
+    """
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+def retry_policy(retries=None):
+    """
+    Returns the retry policy of the shared adapters, with RETRIES retries unless given. Only idempotent methods are
+    retried and the final response is returned rather than raised when the retries run out, so callers still see
+    the status code.
+    """
+    return Retry(
+        total=RETRIES if retries is None else retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+def own_adapter_hosts():
+    return set(HOST_POOL_SIZES) | set(HOST_RETRIES)
+
+def adapter(host=None):
+    """
+    Returns the shared adapter for a host from HOST_POOL_SIZES or HOST_RETRIES, or the default adapter, creating it
+    on first use.
+    """
+    key = host if host in own_adapter_hosts() else None
+    with _lock:
+        if key not in _adapters:
+            _adapters[key] = TimeoutHTTPAdapter(
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                pool_connections=POOL_SIZE,
+                pool_maxsize=HOST_POOL_SIZES.get(key, POOL_SIZE),
+                max_retries=retry_policy(HOST_RETRIES.get(key)),
+            )
+        return _adapters[key]
+
+def mount(session):
+    """
+    Mounts the shared adapters on a session.
+    """
+    default = adapter()
+    session.mount("http://", default)
+    session.mount("https://", default)
+    for host in sorted(own_adapter_hosts()):
+        session.mount("https://{}/".format(host), adapter(host))
+    return session
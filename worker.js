@@ -0,0 +1,462 @@
+// Web Worker holding the search page's sql.js database, so loading the breaches and answering searches never block
+// the page. main.js talks to it with messages:
+//
+//   {id, type: 'init'}               loads the database, answered once every breach is in
+//   {id, type: 'query', request}     answers a DataTables request ({search, order, start, length}) with
+//                                    {recordsTotal, recordsFiltered, data}
+//
+// Answers are {id, result} or {id, error}. While loading, the worker also posts {type: 'progress', rows, total,
+// bytes, totalBytes} and {type: 'rows', rows} once breaches can be searched, which happens as soon as the first
+// chunk is inserted: the dataset shards (or combined.json) are parsed and inserted while they are still
+// downloading. The prebuilt breaches.sqlite, which sql.js can only open once it is downloaded whole, is the
+// fallback when neither is available.
+
+importScripts('https://sql.js.org/dist/sql-wasm.js');
+
+let db;
+
+const SHARD_DIRECTORY = "datasets/shards/";
+const SHARD_CACHE = "known-breaches-shards";
+// breaches inserted in a single transaction while streaming
+const INSERT_BATCH = 5000;
+
+async function initDB() {
+    // Initialize SQL.js
+    const SQL = await initSqlJs({
+        locateFile: file => `https://sql.js.org/dist/${file}`
+    });
+
+    db = new SQL.Database();
+
+    // Create table structure
+    db.run(`CREATE TABLE IF NOT EXISTS breaches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record_count INTEGER,
+        dump_name TEXT,
+        breach_date TEXT,
+        info TEXT,
+        source TEXT
+    )`);
+
+    try {
+        // Load data
+        const rows = await getDatasets();
+        // the same indexes as breaches.sqlite, built once rather than maintained through every insert
+        INDEXES.forEach(index => db.run(index));
+        return {rows};
+    } catch (error) {
+        if (insertedRows) {
+            throw error;
+        }
+        console.warn('Datasets unavailable, opening the prebuilt database:', error);
+    }
+    // Open the prebuilt database generated by scraper.py
+    db.close();
+    db = await loadDatabase(SQL);
+    return {rows: countMatches('')};
+}
+
+const INDEXES = [
+    "CREATE INDEX IF NOT EXISTS breaches_record_count ON breaches (record_count)",
+    "CREATE INDEX IF NOT EXISTS breaches_breach_date ON breaches (breach_date)",
+    "CREATE INDEX IF NOT EXISTS breaches_source ON breaches (source)"
+];
+
+async function loadDatabase(SQL) {
+    const response = await fetch("datasets/breaches.sqlite");
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    const total = parseInt(response.headers.get('Content-Length')) || 0;
+    const reader = response.body.getReader();
+    const chunks = [];
+    let loaded = 0;
+    for (;;) {
+        const {done, value} = await reader.read();
+        if (done) {
+            break;
+        }
+        chunks.push(value);
+        loaded += value.length;
+        postMessage({type: 'progress', rows: 0, total: 0, bytes: loaded, totalBytes: total});
+    }
+    const buffer = new Uint8Array(loaded);
+    let offset = 0;
+    for (const chunk of chunks) {
+        buffer.set(chunk, offset);
+        offset += chunk.length;
+    }
+    const database = new SQL.Database(buffer);
+    hasFts = detectFts(database);
+    return database;
+}
+
+// Incremental parser of a JSON array of objects, returning the elements completed by every chunk of text it is fed
+class JsonArrayStream {
+    constructor() {
+        this.pending = '';
+        this.depth = 0;
+        this.inString = false;
+        this.escaped = false;
+        this.started = false;
+    }
+
+    push(text) {
+        const elements = [];
+        let start = 0;
+        for (let i = 0; i < text.length; i++) {
+            const c = text[i];
+            if (this.inString) {
+                if (this.escaped) {
+                    this.escaped = false;
+                } else if (c === '\\') {
+                    this.escaped = true;
+                } else if (c === '"') {
+                    this.inString = false;
+                }
+            } else if (c === '"') {
+                this.inString = true;
+            } else if (c === '{' || c === '[') {
+                if (!this.started) {
+                    // the opening bracket of the array itself
+                    this.started = true;
+                    start = i + 1;
+                    continue;
+                }
+                if (this.depth === 0) {
+                    start = i;
+                    this.pending = '';
+                }
+                this.depth++;
+            } else if (c === '}' || c === ']') {
+                if (this.depth === 0) {
+                    // the closing bracket of the array
+                    continue;
+                }
+                this.depth--;
+                if (this.depth === 0) {
+                    elements.push(this.pending + text.slice(start, i + 1));
+                    this.pending = '';
+                }
+            }
+        }
+        if (this.depth > 0) {
+            this.pending += text.slice(start);
+        }
+        // parsed as one array rather than one JSON.parse call per element
+        return elements.length ? JSON.parse(`[${elements.join(',')}]`) : elements;
+    }
+}
+
+let insertedRows = 0;
+
+function insertBreaches(data) {
+    // Begin transaction for bulk insert
+    db.run("BEGIN TRANSACTION");
+
+    const stmt = db.prepare(`
+        INSERT INTO breaches (record_count, dump_name, breach_date, info, source)
+        VALUES (?, ?, ?, ?, ?)
+    `);
+
+    data.forEach(item => {
+        // Sanitize and provide default values for all fields
+        const record_count = parseInt(item.record_count) || 0;
+        const dump_name = item.dump_name || 'Unknown';
+        const breach_date = item.breach_date || 'N/A';
+        const info = item.info || 'N/A';
+        const source = item.source || 'Unknown';
+
+        stmt.run([
+            record_count,
+            dump_name,
+            breach_date,
+            info,
+            source
+        ]);
+    });
+
+    stmt.free();
+    db.run("COMMIT");
+    insertedRows += data.length;
+    // More breaches were loaded, the cached counts are stale
+    countCache.clear();
+}
+
+async function ingest(response, progress) {
+    // Parses and inserts the breaches of a JSON array response while it downloads, returns the number inserted
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    const parser = new JsonArrayStream();
+    let batch = [];
+    let rows = 0;
+    for (;;) {
+        const {done, value} = await reader.read();
+        if (!done) {
+            batch = batch.concat(parser.push(value));
+        }
+        if (batch.length >= INSERT_BATCH || (done && batch.length)) {
+            insertBreaches(batch);
+            rows += batch.length;
+            batch = [];
+            progress(rows);
+        }
+        if (done) {
+            return rows;
+        }
+    }
+}
+
+async function decompressedBody(response) {
+    // A host serving the .gz file with Content-Encoding: gzip has the browser decompress it already, which shows in
+    // the first byte: JSON can't start with the gzip magic 0x1f
+    const reader = response.body.getReader();
+    const first = await reader.read();
+    const body = new ReadableStream({
+        start(controller) {
+            if (first.done) {
+                controller.close();
+            } else {
+                controller.enqueue(first.value);
+            }
+        },
+        async pull(controller) {
+            const {done, value} = await reader.read();
+            if (done) {
+                controller.close();
+            } else {
+                controller.enqueue(value);
+            }
+        },
+        cancel(reason) {
+            return reader.cancel(reason);
+        }
+    });
+    return !first.done && first.value[0] === 0x1f ? body.pipeThrough(new DecompressionStream('gzip')) : body;
+}
+
+async function fetchShardFromNetwork(shard) {
+    // Fetch the precompressed copy when the browser can decompress it, it is decompressed as it streams in
+    if (shard.encodings.gzip && typeof DecompressionStream !== 'undefined') {
+        try {
+            const response = await fetch(SHARD_DIRECTORY + shard.encodings.gzip.file);
+            if (response.ok) {
+                return new Response(await decompressedBody(response), {headers: {'Content-Type': 'application/json'}});
+            }
+        } catch (error) {
+            console.warn(`Unable to load ${shard.encodings.gzip.file}, falling back to ${shard.file}:`, error);
+        }
+    }
+    const response = await fetch(SHARD_DIRECTORY + shard.file);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status} loading ${shard.file}`);
+    }
+    return response;
+}
+
+function shardCacheKey(shard) {
+    return `${SHARD_DIRECTORY}${shard.file}?sha256=${shard.sha256}`;
+}
+
+async function fetchShard(shard, cache) {
+    // Shards are cached by content hash, an unchanged shard is never downloaded twice
+    const key = shardCacheKey(shard);
+    let response = cache ? await cache.match(key) : undefined;
+    if (!response) {
+        response = await fetchShardFromNetwork(shard);
+        if (cache) {
+            // not awaited, the cache only has the whole shard once it has been downloaded while the breaches are
+            // inserted as it arrives
+            cache.put(key, response.clone()).catch(error => console.warn(`Unable to cache ${shard.file}:`, error));
+        }
+    }
+    return response;
+}
+
+async function openShardCache(manifest) {
+    if (typeof caches === 'undefined') {
+        return null;
+    }
+    try {
+        const cache = await caches.open(SHARD_CACHE);
+        // Drop the shards of previous versions of the datasets
+        const current = new Set(manifest.shards.map(shard => new URL(shardCacheKey(shard), location.href).href));
+        for (const request of await cache.keys()) {
+            if (!current.has(request.url)) {
+                await cache.delete(request);
+            }
+        }
+        return cache;
+    } catch (error) {
+        console.warn('Shard cache unavailable:', error);
+        return null;
+    }
+}
+
+async function loadShards() {
+    const response = await fetch(SHARD_DIRECTORY + "manifest.json");
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    const manifest = await response.json();
+    const cache = await openShardCache(manifest);
+
+    // Download every shard in parallel but insert them in manifest order, the page is told about every chunk
+    // inserted so it can show the table as soon as the first one is in
+    const shards = manifest.shards.map(shard => fetchShard(shard, cache));
+    for (let i = 0; i < shards.length; i++) {
+        const loaded = insertedRows;
+        await ingest(await shards[i], rows => {
+            postMessage({type: 'progress', rows: loaded + rows, total: manifest.rows});
+            postMessage({type: 'rows', rows: loaded + rows});
+        });
+    }
+    return insertedRows;
+}
+
+async function getDatasets() {
+    try {
+        return await loadShards();
+    } catch (error) {
+        console.warn('Dataset shards unavailable, loading combined.json:', error);
+    }
+    if (insertedRows) {
+        throw new Error('Some dataset shards could not be loaded');
+    }
+
+    const response = await fetch("datasets/combined.json");
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status} loading combined.json`);
+    }
+    const totalBytes = parseInt(response.headers.get('Content-Length')) || 0;
+    // combined.json doesn't say how many breaches it holds, the progress is reported in bytes downloaded
+    let bytes = 0;
+    const counted = new TransformStream({
+        transform(chunk, controller) {
+            bytes += chunk.length;
+            controller.enqueue(chunk);
+        }
+    });
+    return await ingest(new Response(response.body.pipeThrough(counted)), rows => {
+        postMessage({type: 'progress', rows, total: 0, bytes, totalBytes});
+        postMessage({type: 'rows', rows});
+    });
+}
+
+const COLUMNS = ['record_count', 'dump_name', 'breach_date', 'info', 'source'];
+// the trigram tokenizer needs at least three characters to match anything
+const MIN_FTS_LENGTH = 3;
+const COUNT_CACHE_SIZE = 100;
+let hasFts = false;
+// search term -> number of matching rows, cleared whenever more breaches are inserted
+const countCache = new Map();
+
+// breaches.sqlite ships without breaches_fts (see sqlite_export.py), it is only used with a database and a sql.js
+// build that have it
+function detectFts(database) {
+    try {
+        database.exec("SELECT 1 FROM breaches_fts LIMIT 1");
+        return true;
+    } catch (error) {
+        return false;
+    }
+}
+
+function ftsQuery(term) {
+    // Quote the term so it is matched as a substring instead of being parsed as an FTS5 query
+    return `"${term.replace(/"/g, '""')}"`;
+}
+
+function likeWhereClause(term) {
+    const pattern = `%${term.replace(/[\\%_]/g, match => '\\' + match)}%`;
+    return {
+        sql: "WHERE dump_name LIKE ? ESCAPE '\\' OR info LIKE ? ESCAPE '\\' OR source LIKE ? ESCAPE '\\'",
+        params: [pattern, pattern, pattern]
+    };
+}
+
+function countMatches(term) {
+    if (countCache.has(term)) {
+        const count = countCache.get(term);
+        // refresh the entry so the cache evicts the least recently used term
+        countCache.delete(term);
+        countCache.set(term, count);
+        return count;
+    }
+    let result;
+    if (!term) {
+        result = db.exec("SELECT COUNT(*) FROM breaches");
+    } else if (hasFts && term.length >= MIN_FTS_LENGTH) {
+        // counted from the full-text index alone, the breaches table isn't touched
+        result = db.exec("SELECT COUNT(*) FROM breaches_fts WHERE breaches_fts MATCH ?", [ftsQuery(term)]);
+    } else {
+        const where = likeWhereClause(term);
+        result = db.exec(`SELECT COUNT(*) FROM breaches ${where.sql}`, where.params);
+    }
+    const count = result[0].values[0][0];
+    countCache.set(term, count);
+    if (countCache.size > COUNT_CACHE_SIZE) {
+        countCache.delete(countCache.keys().next().value);
+    }
+    return count;
+}
+
+function query(request) {
+    // Get current page, search term, and sort info
+    const searchTerm = request.search;
+    const useFts = hasFts && searchTerm.length >= MIN_FTS_LENGTH;
+
+    // Handle sorting, only known columns and directions ever reach the SQL
+    const sortColumns = request.order
+        .filter(order => COLUMNS[order.column] && ['ASC', 'DESC'].includes(order.dir.toUpperCase()))
+        .map(order => `breaches.${COLUMNS[order.column]} ${order.dir.toUpperCase()}`);
+    // ties are broken by relevance when searching and by id otherwise so paging is stable
+    sortColumns.push(useFts ? 'breaches_fts.rank, breaches.id' : 'breaches.id');
+    const orderClause = `ORDER BY ${sortColumns.join(', ')}`;
+    const selectColumns = COLUMNS.map(column => `breaches.${column}`).join(', ');
+
+    // Get paginated and sorted data, the search term is always bound as a parameter
+    let sql;
+    let params;
+    if (useFts) {
+        sql = `SELECT ${selectColumns} FROM breaches_fts
+            JOIN breaches ON breaches.id = breaches_fts.rowid
+            WHERE breaches_fts MATCH ?
+            ${orderClause} LIMIT ? OFFSET ?`;
+        params = [ftsQuery(searchTerm)];
+    } else {
+        const where = searchTerm ? likeWhereClause(searchTerm) : {sql: '', params: []};
+        sql = `SELECT ${selectColumns} FROM breaches ${where.sql} ${orderClause} LIMIT ? OFFSET ?`;
+        params = where.params;
+    }
+    const result = db.exec(sql, params.concat([request.length, request.start]))[0];
+
+    return {
+        recordsTotal: countMatches(''),
+        recordsFiltered: countMatches(searchTerm),
+        data: result ? result.values : []
+    };
+}
+
+let ready = null;
+
+onmessage = async event => {
+    const message = event.data;
+    try {
+        let result;
+        if (message.type === 'init') {
+            // a second init waits for the first one
+            ready = ready || initDB();
+            result = await ready;
+        } else if (message.type === 'query') {
+            if (!db) {
+                throw new Error('The database is not loaded yet');
+            }
+            result = query(message.request);
+        } else {
+            throw new Error(`Unknown message type ${message.type}`);
+        }
+        postMessage({id: message.id, result});
+    } catch (error) {
+        postMessage({id: message.id, error: error.message});
+    }
+};